@@ -1,4 +1,207 @@
-students = []  # List of dictionaries: each dict has 'name' (str) and 'grades' (list)
+import argparse
+import bisect
+import contextlib
+import csv
+import io
+import itertools
+import json
+import math
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency, only needed by the extended report
+    np = None
+
+
+def validate_name(name):
+    """
+    Check a (stripped) student name: only letters, spaces, or hyphens, and not empty.
+    Raises ValueError with the reason otherwise.
+    """
+    # Check each character
+    for ch in name:
+        if not (ch.isalpha() or ch in (" ", "-")):
+            raise ValueError("Name contains invalid characters")
+
+    if name == "":
+        raise ValueError("Name cannot be empty")
+
+
+def parse_grade(text):
+    """Convert text to a grade from 0 to 100. Raises ValueError otherwise."""
+    grade = int(text)
+    if not (0 <= grade <= 100):
+        raise ValueError("Grade must be from 0 to 100")
+    return grade
+
+
+def new_student(name):
+    """
+    Return a student record with no grades.
+    Besides the grades themselves it keeps a running count and total,
+    updated by add_grade(), so averages never have to be recomputed
+    from the whole list.
+    """
+    return {"name": name, "grades": [], "count": 0, "total": 0}
+
+
+def average(student):
+    """Return the student's average grade, or None if they have no grades."""
+    if student["count"] == 0:
+        return None
+    return student["total"] / student["count"]
+
+
+class StudentRegistry:
+    """
+    Students in insertion order, indexed by case-folded name.
+    Each student is a record made by new_student().
+    A dict keyed by the folded name keeps insertion order, so adding,
+    finding and removing a student are O(1) instead of a scan of all students.
+    Class-wide grade count and total are kept up to date as grades are
+    added and students removed, so the overall average is O(1).
+    Students with grades are also kept in a ranking sorted by average
+    (highest first, ties by name): a rank is a binary search and the
+    top K students are the first K entries. Each new grade moves the
+    student's entry, which costs a binary search plus a shift of the list.
+    With keep_grades=False only the running statistics are stored (the
+    'grades' lists stay empty), so memory depends on the number of
+    students, not grades.
+    """
+
+    def __init__(self, keep_grades=True):
+        self.keep_grades = keep_grades  # type: bool
+        self._by_key = {}  # type: dict
+        self.grade_count = 0  # type: int
+        self.grade_total = 0  # type: int
+        self._ranking = []  # type: list  # sorted (-average, folded name, student)
+        self._ranking_paused = False  # type: bool
+
+    @staticmethod
+    def key(name):
+        """Return the lookup key of a name (case-insensitive)."""
+        return name.casefold()
+
+    def add(self, name):
+        """Add a student with no grades and return it. Raises ValueError for a duplicate name."""
+        key = self.key(name)
+        if key in self._by_key:
+            raise ValueError("Student with this name already exists")
+        student = new_student(name)  # type: dict
+        self._by_key[key] = student
+        return student
+
+    def _rank_key(self, student):
+        return -average(student), self.key(student["name"])
+
+    def _unrank(self, student):
+        if student["count"] and not self._ranking_paused:
+            key = self._rank_key(student)
+            index = bisect.bisect_left(self._ranking, key)
+            del self._ranking[index]
+
+    def add_grade(self, student, grade):
+        """Append a grade to a student and update the student's and the class-wide statistics."""
+        self._unrank(student)
+        if self.keep_grades:
+            student["grades"].append(grade)
+        student["count"] += 1
+        student["total"] += grade
+
+        self.grade_count += 1
+        self.grade_total += grade
+
+        if not self._ranking_paused:
+            bisect.insort(self._ranking, self._rank_key(student) + (student,))
+
+    def add_grades_bulk(self, student, grades):
+        """
+        Append a list of valid grades to a student at once: the statistics
+        are updated with one sum over the list instead of per grade.
+        """
+        if not grades:
+            return
+        self._unrank(student)
+        if self.keep_grades:
+            student["grades"].extend(grades)
+        total = sum(grades)  # type: int
+        student["count"] += len(grades)
+        student["total"] += total
+
+        self.grade_count += len(grades)
+        self.grade_total += total
+
+        if not self._ranking_paused:
+            bisect.insort(self._ranking, self._rank_key(student) + (student,))
+
+    @contextlib.contextmanager
+    def bulk_load(self):
+        """
+        Context manager for adding many grades at once: the ranking is not
+        updated per grade but sorted once when the block ends.
+        """
+        self._ranking_paused = True
+        try:
+            yield self
+        finally:
+            self._ranking_paused = False
+            self._ranking = sorted(self._rank_key(s) + (s,) for s in self._by_key.values() if s["count"])
+
+    def get(self, name):
+        """Return the student with this name (any case), or None."""
+        return self._by_key.get(self.key(name))
+
+    def remove(self, name):
+        """Remove the student with this name. Returns False if there was none."""
+        student = self._by_key.pop(self.key(name), None)
+        if student is None:
+            return False
+        self._unrank(student)
+        self.grade_count -= student["count"]
+        self.grade_total -= student["total"]
+        return True
+
+    def ranked(self):
+        """Iterate (student, average) pairs of students with grades, best average first."""
+        return ((student, -neg_avg) for neg_avg, _, student in self._ranking)
+
+    def top(self, k):
+        """Return up to k (student, average) pairs with the highest averages, best first."""
+        return list(itertools.islice(self.ranked(), max(k, 0)))
+
+    def rank(self, student):
+        """
+        Return the student's rank by average (1 = best; tied students share
+        a rank), or None if they have no grades.
+        """
+        if not student["count"]:
+            return None
+        # Entries before the first one with this average are strictly better
+        return bisect.bisect_left(self._ranking, (-average(student),)) + 1
+
+    def ranked_count(self):
+        """Return how many students have at least one grade (and so a rank)."""
+        return len(self._ranking)
+
+    def overall_average(self):
+        """Return the average of all grades of all students, or None if there are none."""
+        if self.grade_count == 0:
+            return None
+        return self.grade_total / self.grade_count
+
+    def __contains__(self, name):
+        return self.key(name) in self._by_key
+
+    def __len__(self):
+        return len(self._by_key)
+
+    def __iter__(self):
+        return iter(self._by_key.values())
+
+
+students = StudentRegistry()  # All students, in the order they were added
 
 
 def intro():
@@ -7,7 +210,11 @@ def intro():
           "1. Add a new student\n"
           "2. Add a grades for a student\n"
           "3. Show report (all students)\n"
-          "4. Find top performer\n5. Exit")
+          "4. Find top performer\n"
+          "5. Show top students (e.g. 10 or 1%)\n"
+          "6. Show a student's rank\n"
+          "7. Show extended report (needs NumPy)\n"
+          "8. Exit")
 
 
 def main():
@@ -25,12 +232,12 @@ def main():
 
             try:
                 choice_num = int(choice)  # type: int
-                if 1 <= choice_num <= 5:
+                if 1 <= choice_num <= 8:
                     break
                 else:
-                    print("Please enter a number from 1 to 5.\n")
+                    print("Please enter a number from 1 to 8.\n")
             except ValueError:
-                print("Invalid input. Please enter a digit from 1 to 5.\n")
+                print("Invalid input. Please enter a digit from 1 to 8.\n")
 
         match choice_num:
             case 1:
@@ -42,32 +249,30 @@ def main():
             case 4:
                 top_performer()
             case 5:
+                show_top_students()
+            case 6:
+                show_rank()
+            case 7:
+                show_extended_report()
+            case 8:
                 break
 
 
 def create_student():
     """
-    Adds a new student to the global students list.
+    Adds a new student to the global students registry.
     Validates that the name contains only letters, spaces, or hyphens,
-    is not empty, and does not already exist in the list.
+    is not empty, and does not already exist in the registry.
     """
 
     while True:
         name = input("Enter student name: ").strip()  # type: str
 
         try:
-            # Check each character
-            for ch in name:
-                if not (ch.isalpha() or ch in (" ", "-")):
-                    raise ValueError("Name contains invalid characters")
+            validate_name(name)
 
-            if name == "":
-                raise ValueError("Name cannot be empty")
-
-            # Check for duplicates
-            for student in students:
-                if student["name"].lower() == name.lower():
-                    raise ValueError("Student with this name already exists")
+            # Add the student; raises ValueError for a duplicate name
+            students.add(name)
 
             # Valid name, exit loop
             break
@@ -75,9 +280,6 @@ def create_student():
         except ValueError as e:
             print(f"Invalid name: {e}. Use letters only (spaces and hyphens allowed).")
 
-    student_data = {"name": name, "grades": []}  # type: dict
-    students.append(student_data)
-
 
 def add_grades():
     """
@@ -89,11 +291,7 @@ def add_grades():
     student_name = input("Enter a student name: ").strip()  # type: str
 
     # student search
-    student = None  # type: dict or None
-    for s in students:
-        if s["name"].lower() == student_name.lower():
-            student = s
-            break
+    student = students.get(student_name)  # type: dict or None
 
     if student is None:
         print("There is no student with that name on the list. Add the student first.")
@@ -107,21 +305,21 @@ def add_grades():
             return
 
         try:
-            grade = int(grade_input)
-            if not (0 <= grade <= 100):
-                raise ValueError("Grade must be from 0 to 100")
+            grade = parse_grade(grade_input)
 
-            student["grades"].append(grade)
+            students.add_grade(student, grade)
 
         except ValueError as e:
             print(f"Invalid input: {e}. Try again.")
 
 
-def show_report():
+def show_report(students=students):
     """
-    Prints the report for all students, showing their average grades.
-    Handles ZeroDivisionError if a student has no grades.
+    Prints the report for all students, showing their average grades
+    (N/A for a student with no grades).
     Calculates and displays max, min, and overall average grade.
+    Uses the running statistics, so it costs one pass over the students.
+    Reports on the global students unless another registry is given.
     """
 
     if not students:
@@ -131,36 +329,27 @@ def show_report():
     # list of averages only for students with grades
     averages = []  # type: list
 
-    # all grades of all students
-    all_grades = []  # type: list
-
     for student in students:
-        grades = student["grades"]  # type: list
-
-        try:
-            if len(grades) == 0:
-                raise ZeroDivisionError
-
-            avg = sum(grades) / len(grades)
-            averages.append(avg)
-            all_grades.extend(grades)
-
-            print(f"{student['name'].title()}'s average grade is {avg:.2f}")
+        avg = average(student)  # type: float or None
 
-        except ZeroDivisionError:
+        if avg is None:
             print(f"{student['name'].title()}'s average grade is N/A")
+            continue
+
+        averages.append(avg)
+        print(f"{student['name'].title()}'s average grade is {avg:.2f}")
 
     print()
 
     # Check: is there even one rating at all
-    if not all_grades:
+    if students.grade_count == 0:
         print("No grades available for any student.\n")
         return
 
-    # Calculate statistics
+    # Calculate statistics (averages come from the running totals)
     max_avg = max(averages)
     min_avg = min(averages)
-    overall_avg = sum(all_grades) / len(all_grades)
+    overall_avg = students.overall_average()
 
     print(f"Max average: {max_avg:.2f}")
     print(f"Min average: {min_avg:.2f}")
@@ -178,27 +367,17 @@ def top_performer():
         print("No students in the list.\n")
         return
 
-    # create a list of students with at least one grade
-    students_with_grades = [s for s in students if s["grades"]]
+    ranked = students.top(1)  # type: list
 
-    if not students_with_grades:
+    if not ranked:
         print("No grades available for any student.\n")
         return
 
-    # Find the student with the maximum average
-    max_avg = max(
-        students_with_grades,
-        key=lambda s: sum(s["grades"]) / len(s["grades"])
-    )
-
-    # calculate max_average itself
-    max_average_value = sum(max_avg["grades"]) / len(max_avg["grades"])
-
-    # Find all students with the same max average
-    top_students = [
-        s for s in students_with_grades
-        if sum(s["grades"]) / len(s["grades"]) == max_average_value
-    ]
+    # The ranking is sorted by average: the students sharing the top
+    # average are at its front
+    max_average_value = ranked[0][1]
+    tied = itertools.takewhile(lambda pair: pair[1] == max_average_value, students.ranked())
+    top_students = [s for s, _ in tied]
 
     # Display the result
     print("\nTop performer(s):")
@@ -207,4 +386,399 @@ def top_performer():
     print()
 
 
-main()
+def parse_top_count(text, total):
+    """
+    Turn '10' (a number of students) or '1%' (a share of the ranked
+    students, rounded up) into a count. Raises ValueError for anything else.
+    """
+    text = text.strip()
+    if text.endswith("%"):
+        percent = float(text[:-1])
+        if not (0 < percent <= 100):
+            raise ValueError("Percentage must be between 0 and 100")
+        return math.ceil(total * percent / 100)
+    count = int(text)
+    if count <= 0:
+        raise ValueError("Number must be positive")
+    return count
+
+
+def show_top_students():
+    """
+    Prints the K students with the highest averages, best first.
+    K is a number of students or a percentage of the ranked students.
+    """
+
+    total = students.ranked_count()  # type: int
+    if total == 0:
+        print("No grades available for any student.\n")
+        return
+
+    try:
+        k = parse_top_count(input("How many top students (e.g. 10 or 1%): "), total)
+    except ValueError as e:
+        print(f"Invalid input: {e}.\n")
+        return
+
+    print(f"\nTop {min(k, total)} of {total} student(s):")
+    for student, avg in students.top(k):
+        print(f"{students.rank(student)}. {student['name'].title()} with average grade {avg:.2f}")
+    print()
+
+
+def show_rank():
+    """
+    Prints a student's rank by average grade among all students with grades.
+    """
+
+    student = students.get(input("Enter a student name: ").strip())  # type: dict or None
+    if student is None:
+        print("There is no student with that name on the list.\n")
+        return
+
+    rank = students.rank(student)  # type: int or None
+    if rank is None:
+        print(f"{student['name'].title()} has no grades yet.\n")
+        return
+    print(f"{student['name'].title()} is ranked {rank} of {students.ranked_count()} "
+          f"with average grade {average(student):.2f}\n")
+
+
+class ColumnarGrades:
+    """
+    Column store of all grades for the NumPy report.
+    The grades of every student are laid out back to back in one
+    contiguous integer array; offsets[i]:offsets[i + 1] is the slice of
+    student i (so offsets has one more entry than there are students).
+    Per-student sums, minimums and maximums are single vectorized
+    reductions over the segments (np.add.reduceat and friends) instead
+    of a Python loop per student.
+    """
+
+    def __init__(self, names, grades, offsets):
+        self.names = names  # type: list
+        self.grades = grades  # type: np.ndarray
+        self.offsets = offsets  # type: np.ndarray
+
+    @classmethod
+    def from_registry(cls, registry):
+        """Build the columns from a registry that keeps grades (keep_grades=True)."""
+        if np is None:
+            raise RuntimeError("The extended report needs NumPy (pip install numpy)")
+        if not registry.keep_grades:
+            raise ValueError("The registry does not keep individual grades")
+        names = [student["name"] for student in registry]
+        counts = np.fromiter((student["count"] for student in registry), dtype=np.int64, count=len(names))
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        grades = np.fromiter(
+            itertools.chain.from_iterable(student["grades"] for student in registry),
+            dtype=np.int16, count=int(offsets[-1]),
+        )
+        return cls(names, grades, offsets)
+
+    def student_stats(self):
+        """
+        Return per-student arrays (count, average, std dev, min, max).
+        Students without grades get NaN averages/std devs and -1 min/max.
+        """
+        counts = np.diff(self.offsets)
+        graded = counts > 0
+        # reduceat runs from each start to the next one: skipping empty
+        # segments keeps every slice exactly one student's grades
+        starts = self.offsets[:-1][graded]
+        sums = np.add.reduceat(self.grades, starts, dtype=np.int64) if starts.size else np.zeros(0, np.int64)
+        squares = self.grades.astype(np.int64) ** 2
+        sum_sq = np.add.reduceat(squares, starts) if starts.size else np.zeros(0, np.int64)
+
+        averages = np.full(len(counts), np.nan)
+        std_devs = np.full(len(counts), np.nan)
+        mins = np.full(len(counts), -1, dtype=np.int64)
+        maxs = np.full(len(counts), -1, dtype=np.int64)
+        if starts.size:
+            n = counts[graded]
+            averages[graded] = sums / n
+            std_devs[graded] = np.sqrt(np.maximum(sum_sq / n - (sums / n) ** 2, 0.0))
+            mins[graded] = np.minimum.reduceat(self.grades, starts)
+            maxs[graded] = np.maximum.reduceat(self.grades, starts)
+        return counts, averages, std_devs, mins, maxs
+
+    def overall_stats(self, percentiles=(25, 50, 75, 90), bins=10):
+        """Return mean, std dev, the given percentiles and a histogram of all grades."""
+        if self.grades.size == 0:
+            return None
+        hist, edges = np.histogram(self.grades, bins=bins, range=(0, 100))
+        return {
+            "mean": float(self.grades.mean(dtype=np.float64)),
+            "std": float(self.grades.std(dtype=np.float64)),
+            "percentiles": dict(zip(percentiles, np.percentile(self.grades, percentiles).tolist())),
+            "histogram": list(zip(edges[:-1].tolist(), edges[1:].tolist(), hist.tolist())),
+        }
+
+
+def show_extended_report(students=students):
+    """
+    Prints show_report's figures plus per-student standard deviation,
+    min and max, and for all grades the standard deviation, percentiles
+    and a histogram, computed with the NumPy column store (ColumnarGrades).
+    """
+
+    if np is None:
+        print("The extended report needs NumPy (pip install numpy).\n")
+        return
+    if not students:
+        print("There are no students in the list.")
+        return
+
+    columns = ColumnarGrades.from_registry(students)
+    counts, averages, std_devs, mins, maxs = columns.student_stats()
+
+    for name, count, avg, std, low, high in zip(
+        columns.names, counts.tolist(), averages.tolist(), std_devs.tolist(), mins.tolist(), maxs.tolist()
+    ):
+        if count == 0:
+            print(f"{name.title()}'s average grade is N/A")
+        else:
+            print(f"{name.title()}'s average grade is {avg:.2f} "
+                  f"(std dev {std:.2f}, min {low}, max {high}, {count} grade(s))")
+
+    print()
+
+    overall = columns.overall_stats()
+    if overall is None:
+        print("No grades available for any student.\n")
+        return
+
+    graded_averages = averages[counts > 0]
+    print(f"Max average: {graded_averages.max():.2f}")
+    print(f"Min average: {graded_averages.min():.2f}")
+    print(f"Overall average grade: {overall['mean']:.2f}")
+    print(f"Standard deviation of all grades: {overall['std']:.2f}")
+    print("Percentiles: " + ", ".join(f"{p}th {value:.1f}" for p, value in overall["percentiles"].items()))
+    print("Histogram of all grades:")
+    largest = max(count for _, _, count in overall["histogram"]) or 1
+    for low, high, count in overall["histogram"]:
+        bar = "#" * round(40 * count / largest)
+        print(f"  {low:5.1f}-{high:5.1f} | {bar} {count}")
+    print()
+
+
+def benchmark(total_grades=10_000_000, student_count=100_000, seed=0):
+    """
+    Time the report statistics on a synthetic roster: show_report (running
+    totals), the same figures plus the extended statistics recomputed in
+    pure Python from the grade lists (what show_report used to do), and
+    the NumPy column store. Report output is discarded; only the
+    computation is compared.
+    """
+    if np is None:
+        raise RuntimeError("The benchmark needs NumPy (pip install numpy)")
+
+    rng = np.random.default_rng(seed)
+    owners = np.sort(rng.integers(0, student_count, size=total_grades))
+    all_grades = rng.integers(0, 101, size=total_grades, dtype=np.int16)
+    bounds = np.searchsorted(owners, np.arange(student_count + 1)).tolist()
+
+    registry = StudentRegistry()
+    grade_list = all_grades.tolist()
+    with registry.bulk_load():
+        for i in range(student_count):
+            student = registry.add(f"Student {i}")
+            registry.add_grades_bulk(student, grade_list[bounds[i]:bounds[i + 1]])
+    del grade_list
+
+    def python_stats():
+        averages, flat = [], []
+        for student in registry:
+            grades = student["grades"]
+            if grades:
+                averages.append(sum(grades) / len(grades))
+                flat.extend(grades)
+        mean = sum(flat) / len(flat)
+        std = math.sqrt(sum((g - mean) ** 2 for g in flat) / len(flat))
+        ordered = sorted(flat)
+        percentiles = [ordered[min(len(ordered) - 1, len(ordered) * p // 100)] for p in (25, 50, 75, 90)]
+        histogram = [0] * 10
+        for g in flat:
+            histogram[min(g // 10, 9)] += 1
+        return max(averages), min(averages), mean, std, percentiles, histogram
+
+    def numpy_stats(columns=None):
+        columns = columns or ColumnarGrades.from_registry(registry)
+        return columns.student_stats(), columns.overall_stats()
+
+    prebuilt = ColumnarGrades.from_registry(registry)
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for label, func in (
+            ("show_report (running totals, prints)", lambda: show_report(registry)),
+            ("pure Python recompute + extended stats", python_stats),
+            ("NumPy: build columns + reductions", numpy_stats),
+            ("NumPy: reductions only", lambda: numpy_stats(prebuilt)),
+        ):
+            started = time.perf_counter()
+            func()
+            timings.append((label, time.perf_counter() - started))
+
+    print(f"{total_grades:,} grades, {student_count:,} students")
+    for label, seconds in timings:
+        print(f"  {label:<40} {seconds:8.3f}s")
+    return timings
+
+
+def read_rows(path, fmt=None):
+    """
+    Stream (line number, name, raw grade) tuples from a CSV or NDJSON file.
+    CSV rows are 'name,grade' (a 'name,grade' header line is skipped);
+    NDJSON lines are {"name": ..., "grade": ...}. The format comes from
+    the file extension unless fmt is given; '-' reads CSV from stdin.
+    """
+    if fmt is None:
+        fmt = "ndjson" if path.lower().endswith((".ndjson", ".jsonl")) else "csv"
+
+    with (contextlib.nullcontext(sys.stdin) if path == "-" else open(path, newline="", encoding="utf-8")) as f:
+        if fmt == "ndjson":
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                    name, raw_grade = item["name"], item["grade"]
+                except (ValueError, KeyError, TypeError):
+                    yield line_no, None, None
+                    continue
+                if not isinstance(name, str):
+                    yield line_no, None, None
+                    continue
+                yield line_no, name, raw_grade
+        else:
+            for line_no, row in enumerate(csv.reader(f), start=1):
+                if not row:
+                    continue
+                if line_no == 1 and [cell.strip().lower() for cell in row] == ["name", "grade"]:
+                    continue
+                if len(row) != 2:
+                    yield line_no, None, None
+                    continue
+                yield line_no, row[0], row[1]
+
+
+class BatchErrors:
+    """
+    Invalid rows of a batch run: every one is counted, but only the first
+    `limit` (line number, reason) pairs are kept, so memory stays bounded.
+    """
+
+    def __init__(self, limit=10):
+        self.limit = limit  # type: int
+        self.rows = []  # type: list
+        self.count = 0  # type: int
+
+    def add(self, line_no, reason):
+        self.count += 1
+        if len(self.rows) < self.limit:
+            self.rows.append((line_no, reason))
+
+    def __len__(self):
+        return self.count
+
+
+def validated_grades(rows, registry, errors):
+    """
+    Yield (student, grade) for valid rows, using the interactive rules
+    (names: letters, spaces, hyphens; grades: integers 0-100).
+    Students are added to the registry the first time they appear.
+    Invalid rows are reported to errors (a BatchErrors) with their reason.
+    """
+    # Rows repeat the same names and the same 101 grades: remember what
+    # was already resolved instead of validating every row again
+    known_students = {}  # type: dict  # raw name -> student
+    known_grades = {}  # type: dict  # raw grade -> grade
+
+    for line_no, name, raw_grade in rows:
+        if name is None:
+            errors.add(line_no, "Malformed row")
+            continue
+        try:
+            # NDJSON grades can be any JSON value; only ints and strings are
+            # grades (and hashable), bool is an int subclass but not a grade
+            if isinstance(raw_grade, bool) or not isinstance(raw_grade, (int, str)):
+                raise ValueError("Grade must be a whole number")
+            grade = known_grades.get(raw_grade)
+            if grade is None:
+                grade = known_grades[raw_grade] = parse_grade(str(raw_grade).strip())
+
+            student = known_students.get(name)  # type: dict or None
+            if student is None:
+                clean = name.strip()  # type: str
+                student = registry.get(clean)
+                if student is None:
+                    validate_name(clean)
+                    student = registry.add(clean)
+                known_students[name] = student
+        except ValueError as e:
+            errors.add(line_no, str(e))
+            continue
+        yield student, grade
+
+
+def run_batch(path, fmt=None, max_errors=10, extended=False):
+    """
+    Non-interactive mode: ingest a file of (student, grade) rows in one
+    streaming pass and print the same report as show_report().
+    Only running statistics are kept, so memory does not grow with the
+    number of grades; extended=True keeps the grades and prints
+    show_extended_report() instead. Returns the number of invalid rows.
+    """
+    registry = StudentRegistry(keep_grades=extended)
+    errors = BatchErrors(max_errors)
+    started = time.perf_counter()
+
+    with registry.bulk_load():
+        for student, grade in validated_grades(read_rows(path, fmt), registry, errors):
+            registry.add_grade(student, grade)
+
+    elapsed = time.perf_counter() - started
+    if extended:
+        show_extended_report(registry)
+    else:
+        show_report(registry)
+
+    for line_no, reason in errors.rows:
+        print(f"Line {line_no}: {reason}", file=sys.stderr)
+    if errors.count > len(errors.rows):
+        print(f"... and {errors.count - len(errors.rows)} more invalid row(s)", file=sys.stderr)
+    print(f"Processed {registry.grade_count + len(errors)} row(s), {len(errors)} invalid, "
+          f"{len(registry)} student(s) in {elapsed:.2f}s", file=sys.stderr)
+    return len(errors)
+
+
+def positive_int(text):
+    """argparse type for a whole number greater than zero."""
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {text!r}")
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0, got {value}")
+    return value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Student Grade Analyzer. Without arguments, starts the interactive menu."
+    )
+    parser.add_argument("file", nargs="?", help="CSV or NDJSON file of (name, grade) rows ('-' for stdin)")
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="file format (default: from the extension)")
+    parser.add_argument("--max-errors", type=int, default=10, help="invalid rows to list (default 10)")
+    parser.add_argument("--extended", action="store_true", help="print the NumPy extended report")
+    parser.add_argument("--benchmark", type=positive_int, nargs="?", const=10_000_000, metavar="GRADES",
+                        help="compare report engines on synthetic grades (default 10,000,000)")
+    args = parser.parse_args()
+
+    if args.benchmark is not None:
+        benchmark(args.benchmark)
+    elif args.file is None:
+        main()
+    else:
+        sys.exit(1 if run_batch(args.file, args.format, args.max_errors, args.extended) else 0)
@@ -0,0 +1,146 @@
+import argparse
+import json
+
+import pytest
+
+import grade_analyzer
+from grade_analyzer import BatchErrors, StudentRegistry, read_rows, run_batch, validated_grades
+
+
+# ---------------------------
+# Helpers
+# ---------------------------
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def ingest(path, fmt=None, limit=10):
+    registry = StudentRegistry()
+    errors = BatchErrors(limit)
+    with registry.bulk_load():
+        for student, grade in validated_grades(read_rows(path, fmt), registry, errors):
+            registry.add_grade(student, grade)
+    return registry, errors
+
+
+# ---------------------------
+# Registry and ranking
+# ---------------------------
+def test_registry_is_case_insensitive():
+    registry = StudentRegistry()
+    student = registry.add("Alice")
+    assert registry.get("ALICE") is student
+    assert "alice" in registry
+    with pytest.raises(ValueError):
+        registry.add("alice")
+
+
+def test_ranking_follows_grades_and_removal():
+    registry = StudentRegistry()
+    for name, grades in (("Alice", [90, 80]), ("Bob", [70]), ("Carol", [95]), ("Dave", [])):
+        student = registry.add(name)
+        for grade in grades:
+            registry.add_grade(student, grade)
+
+    assert [(s["name"], avg) for s, avg in registry.top(2)] == [("Carol", 95), ("Alice", 85)]
+    assert registry.rank(registry.get("bob")) == 3
+    assert registry.rank(registry.get("Dave")) is None
+    assert registry.overall_average() == pytest.approx(335 / 4)
+
+    registry.remove("Carol")
+    assert [s["name"] for s, _ in registry.ranked()] == ["Alice", "Bob"]
+    assert registry.grade_count == 3
+    assert registry.overall_average() == pytest.approx(80)
+
+
+# ---------------------------
+# Batch ingestion
+# ---------------------------
+def test_csv_skips_header_and_reports_bad_rows(tmp_path):
+    path = write(tmp_path, "grades.csv", "name,grade\nAlice,90\nalice,80\nBob,101\nB0b,50\nCarol\nCarol,7.5\n\nBob,60\n")
+    registry, errors = ingest(path)
+
+    assert [s["name"] for s in registry] == ["Alice", "Bob"]
+    assert registry.get("alice")["total"] == 170
+    assert registry.get("bob")["count"] == 1
+    assert [line_no for line_no, _ in errors.rows] == [4, 5, 6, 7]
+    assert errors.rows[0][1] == "Grade must be from 0 to 100"
+    assert errors.rows[1][1] == "Name contains invalid characters"
+    assert errors.rows[2][1] == "Malformed row"
+
+
+def test_ndjson_rejects_non_string_names_and_non_scalar_grades(tmp_path):
+    lines = [
+        {"name": "Alice", "grade": 90},
+        {"name": "Alice", "grade": "80"},
+        {"name": None, "grade": 50},
+        {"name": 123, "grade": 50},
+        {"name": "Bob", "grade": [1]},
+        {"name": "Bob", "grade": {"value": 1}},
+        {"name": "Bob", "grade": True},
+        {"name": "Bob", "grade": 7.5},
+        {"name": "Bob"},
+    ]
+    text = "\n".join(json.dumps(line) for line in lines) + "\nnot json\n"
+    registry, errors = ingest(write(tmp_path, "grades.ndjson", text))
+
+    assert [s["name"] for s in registry] == ["Alice"]
+    assert registry.get("Alice")["total"] == 170
+    assert dict(errors.rows) == {
+        3: "Malformed row",
+        4: "Malformed row",
+        5: "Grade must be a whole number",
+        6: "Grade must be a whole number",
+        7: "Grade must be a whole number",
+        8: "Grade must be a whole number",
+        9: "Malformed row",
+        10: "Malformed row",
+    }
+
+
+def test_errors_keep_only_the_first_rows(tmp_path):
+    path = write(tmp_path, "grades.csv", "".join(f"Alice,{100 + n}\n" for n in range(1, 51)))
+    registry, errors = ingest(path, limit=3)
+    assert len(errors) == 50
+    assert [line_no for line_no, _ in errors.rows] == [1, 2, 3]
+    assert len(registry) == 0
+
+
+def test_run_batch_prints_report(tmp_path, capsys):
+    path = write(tmp_path, "grades.csv", "name,grade\nalice,90\nbob,70\nbob,80\nbob,x\n")
+    assert run_batch(path, max_errors=10) == 1
+
+    out, err = capsys.readouterr()
+    assert "Alice's average grade is 90.00" in out
+    assert "Bob's average grade is 75.00" in out
+    assert "Max average: 90.00" in out
+    assert "Min average: 75.00" in out
+    assert "Overall average grade: 80.00" in out
+    assert "Line 5:" in err
+    assert "Processed 4 row(s), 1 invalid, 2 student(s)" in err
+
+
+def test_run_batch_lists_at_most_max_errors(tmp_path, capsys):
+    path = write(tmp_path, "grades.ndjson", "{}\n" * 5 + '{"name": "Alice", "grade": 90}\n')
+    assert run_batch(path, max_errors=2) == 5
+
+    err = capsys.readouterr().err
+    assert err.count("Malformed row") == 2
+    assert "... and 3 more invalid row(s)" in err
+
+
+@pytest.mark.skipif(grade_analyzer.np is None, reason="NumPy is not installed")
+def test_extended_report_matches_running_statistics(tmp_path, capsys):
+    path = write(tmp_path, "grades.csv", "alice,90\nalice,70\nbob,60\n")
+    assert run_batch(path, extended=True) == 0
+    out = capsys.readouterr().out
+    assert "Overall average grade: 73.33" in out
+
+
+def test_benchmark_size_must_be_positive():
+    assert grade_analyzer.positive_int("1000") == 1000
+    for text in ("0", "-5", "ten"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            grade_analyzer.positive_int(text)
@@ -0,0 +1,354 @@
+"""
+Load-testing benchmark for the Book API.
+
+Seeds a catalogue of synthetic books, then runs a weighted mix of
+create/read/list/search/update/delete requests from concurrent workers and
+reports latency percentiles (p50/p95/p99) and throughput as JSON, so runs
+on different commits can be compared.
+
+Targets:
+- `--mode inprocess` (default): the app is called directly through
+  httpx's ASGITransport against a fresh SQLite file. No network or server
+  process is involved, so this measures crud.py/main.py themselves.
+- `--mode uvicorn`: starts `uvicorn main:app` (optionally with several
+  `--workers`) on a free local port against a fresh SQLite file.
+- `--base-url URL`: an already running instance (its database is used as is).
+
+Examples:
+    python bench.py --books 100000 --requests 20000 --concurrency 64
+    python bench.py --mode uvicorn --workers 4 --mix read=8,search=2 --output run.json
+    python bench.py --books 10000 --compare run.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+
+WORDS = (
+    "shadow river garden empire winter silent golden broken hidden last night city stone "
+    "dream house ocean wolf crown storm glass fire secret journey forest iron star letter "
+    "road mountain queen machine island memory song light war peace time"
+).split()
+
+AUTHORS = (
+    "Ada Byron", "Leo Tolstoy", "Ursula Le Guin", "Isaac Asimov", "Toni Morrison",
+    "Haruki Murakami", "Jane Austen", "Chinua Achebe", "Italo Calvino", "Octavia Butler",
+)
+
+OPERATIONS = ("create", "read", "list", "search", "update", "delete")
+
+DEFAULT_MIX = "create=1,read=6,list=1,search=2,update=1,delete=0.5"
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def synthetic_book(index: int, rng: random.Random) -> Dict:
+    """Deterministic-ish synthetic book; `index` keeps (title, author, year) unique."""
+    title = " ".join(rng.choice(WORDS) for _ in range(3)).title()
+    return {"title": f"{title} {index}", "author": rng.choice(AUTHORS), "year": rng.randint(1800, 2025)}
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """Parse `op=weight,...` into a weight per operation."""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}; choose from {OPERATIONS}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values), max(1, math.ceil(fraction * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "rps": len(values) / elapsed if elapsed else 0.0,
+        "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+        "p50_ms": percentile(values, 0.50) * 1000,
+        "p95_ms": percentile(values, 0.95) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+        "max_ms": values[-1] * 1000 if values else 0.0,
+    }
+
+
+async def seed(client: httpx.AsyncClient, count: int, chunk: int, rng: random.Random) -> Dict:
+    """Load `count` synthetic books through POST /books/bulk (NDJSON)."""
+    started = time.perf_counter()
+    created = 0
+    for offset in range(0, count, chunk):
+        lines = "\n".join(
+            json.dumps(synthetic_book(i, rng)) for i in range(offset, min(offset + chunk, count))
+        )
+        response = await client.post(
+            "/books/bulk", params={"chunk_size": chunk}, content=lines,
+            headers={"Content-Type": "application/x-ndjson"}, timeout=None,
+        )
+        response.raise_for_status()
+        created += response.json()["created"]
+    elapsed = time.perf_counter() - started
+    return {"requested": count, "created": created, "seconds": elapsed, "rows_per_sec": count / elapsed if elapsed else 0.0}
+
+
+async def sample_ids(client: httpx.AsyncClient, limit: int) -> List[int]:
+    """Collect up to `limit` existing ids by walking cursor pages of GET /books/."""
+    ids: List[int] = []
+    params = {"limit": min(1000, limit)}
+    while len(ids) < limit:
+        response = await client.get("/books/", params=params)
+        response.raise_for_status()
+        ids.extend(book["id"] for book in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params = {"limit": min(1000, limit - len(ids)), "after": cursor}
+    return ids[:limit]
+
+
+class Workload:
+    """Shared state of one benchmark run: id pools, counters and latencies."""
+
+    def __init__(self, client: httpx.AsyncClient, ids: List[int], mix: Dict[str, float], seed_value: int):
+        self.client = client
+        self.ids = ids
+        self.created: List[int] = []
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.rng = random.Random(seed_value)
+        self.next_index = 10**9  # synthetic indexes above any seeded one
+        self.latencies: Dict[str, List[float]] = {name: [] for name in OPERATIONS}
+        self.errors: Dict[str, int] = {name: 0 for name in OPERATIONS}
+
+    def _request(self, operation: str):
+        rng = self.rng
+        if operation == "create" or (operation in ("read", "update") and not self.ids):
+            self.next_index += 1
+            return "create", self.client.post("/books/", json=synthetic_book(self.next_index, rng))
+        if operation == "read":
+            return operation, self.client.get(f"/books/{rng.choice(self.ids)}")
+        if operation == "list":
+            return operation, self.client.get("/books/", params={"limit": 100, "skip": rng.randint(0, 1000)})
+        if operation == "search":
+            return operation, self.client.get("/books/search/", params={"title": rng.choice(WORDS)})
+        if operation == "update":
+            return operation, self.client.put(f"/books/{rng.choice(self.ids)}", json={"year": rng.randint(1800, 2025)})
+        if self.created:
+            # Only delete books created during the run, so reads keep hitting rows
+            return operation, self.client.delete(f"/books/{self.created.pop()}")
+        return self._request("read")
+
+    async def worker(self, deadline: Optional[float], remaining: List[int]) -> None:
+        while remaining[0] > 0 and (deadline is None or time.perf_counter() < deadline):
+            remaining[0] -= 1
+            operation = self.rng.choices(self.names, self.weights)[0]
+            operation, request = self._request(operation)
+            started = time.perf_counter()
+            try:
+                response = await request
+            except httpx.HTTPError:
+                self.errors[operation] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 400 and not (operation == "create" and response.status_code == 409):
+                self.errors[operation] += 1
+                continue
+            self.latencies[operation].append(elapsed)
+            if operation == "create" and response.status_code == 201:
+                self.created.append(response.json()["id"])
+
+
+async def run_workload(client: httpx.AsyncClient, args) -> Dict:
+    rng = random.Random(args.seed)
+    report = {}
+    if args.books:
+        report["seed"] = await seed(client, args.books, args.seed_chunk, rng)
+    ids = await sample_ids(client, args.id_pool)
+
+    workload = Workload(client, ids, args.mix, args.seed)
+    remaining = [args.requests if args.requests else sys.maxsize]
+    deadline = time.perf_counter() + args.duration if args.duration else None
+    started = time.perf_counter()
+    await asyncio.gather(*(workload.worker(deadline, remaining) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    all_latencies = [value for values in workload.latencies.values() for value in values]
+    report["elapsed_seconds"] = elapsed
+    report["operations"] = {
+        name: summarize(workload.latencies[name], workload.errors[name], elapsed)
+        for name in OPERATIONS
+        if workload.latencies[name] or workload.errors[name]
+    }
+    report["total"] = summarize(all_latencies, sum(workload.errors.values()), elapsed)
+    return report
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_until_healthy(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while True:
+            try:
+                if (await client.get("/healthcheck")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"Server at {base_url} did not become healthy")
+            await asyncio.sleep(0.2)
+
+
+async def run(args) -> Dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+            return await run_workload(client, args)
+
+    # The temporary database (gigabytes for big seeds) goes away with the run
+    with tempfile.TemporaryDirectory(prefix="book-bench-") as workdir:
+        database_url = args.database_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}"
+        if args.mode == "inprocess":
+            return await _run_inprocess(args, database_url)
+        return await _run_uvicorn(args, database_url, limits)
+
+
+async def _run_inprocess(args, database_url: str) -> Dict:
+    # Settings are read at import time, so point the app at the bench DB first
+    os.environ["DATABASE_URL"] = database_url
+    sys.path.insert(0, HERE)
+    import main
+    import migrations
+
+    try:
+        await migrations.migrate(main.engine)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            return await run_workload(client, args)
+    finally:
+        # Close the pooled connections before the database file is removed
+        await main.engine.dispose()
+
+
+async def _run_uvicorn(args, database_url: str, limits: httpx.Limits) -> Dict:
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=HERE, env={**os.environ, "DATABASE_URL": database_url},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        await _wait_until_healthy(base_url)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+            return await run_workload(client, args)
+    finally:
+        # The server must be gone before its database file is removed
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict, baseline: Dict) -> str:
+    """Render a per-operation comparison of p95 latency and throughput against a baseline run."""
+    lines = [f"{'operation':<10} {'p95 ms':>18} {'rps':>20}"]
+    for name, stats in {**current["operations"], "total": current["total"]}.items():
+        base = baseline["operations"].get(name) if name != "total" else baseline["total"]
+        if not base:
+            continue
+        p95_change = (stats["p95_ms"] / base["p95_ms"] - 1) * 100 if base["p95_ms"] else 0.0
+        rps_change = (stats["rps"] / base["rps"] - 1) * 100 if base["rps"] else 0.0
+        lines.append(
+            f"{name:<10} {base['p95_ms']:8.2f}->{stats['p95_ms']:7.2f} "
+            f"{base['rps']:9.1f}->{stats['rps']:8.1f} ({p95_change:+.1f}% / {rps_change:+.1f}%)"
+        )
+    return "\n".join(lines)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--base-url", help="benchmark an already running server instead")
+    parser.add_argument("--database-url", help="database for inprocess/uvicorn modes (default: fresh temp SQLite file)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes (uvicorn mode)")
+    parser.add_argument("--books", type=int, default=10000, help="synthetic books to seed before the run (0 to skip)")
+    parser.add_argument("--seed-chunk", type=int, default=5000, help="books per bulk request while seeding")
+    parser.add_argument("--id-pool", type=int, default=10000, help="existing ids used by read/update requests")
+    parser.add_argument("--requests", type=int, default=10000, help="total requests (0 for unlimited, use --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="stop after this many seconds (0 for no limit)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"default: {DEFAULT_MIX}")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument("--output", help="write the JSON report to this file (default: stdout)")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    return parser
+
+
+def main(argv=None) -> None:
+    args = build_parser().parse_args(argv)
+    if not args.requests and not args.duration:
+        raise SystemExit("Use --requests or --duration to bound the run")
+
+    report = asyncio.run(run(args))
+    report["config"] = {
+        "mode": "external" if args.base_url else args.mode,
+        "workers": args.workers,
+        "books": args.books,
+        "requests": args.requests,
+        "duration": args.duration,
+        "concurrency": args.concurrency,
+        "mix": args.mix,
+    }
+    report["git_commit"] = _git_commit()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(compare(report, json.load(f)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
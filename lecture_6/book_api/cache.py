@@ -0,0 +1,188 @@
+"""
+Read-through cache for single-book responses.
+
+`GET /books/{book_id}` is dominated by a small set of popular ids, so the
+serialized `BookOut` JSON of each book is cached by id, together with its
+ETag/Last-Modified headers, as a `CachedResponse` and served without
+opening a database session. Writes (`PUT`/`DELETE`) invalidate the entry.
+
+Backends share one small async interface so they can be swapped by
+configuration:
+- `LRUCache`: bounded in-process LRU with a TTL (default).
+- `RedisCache`: any Redis-compatible server, shared by several uvicorn
+  workers. Needs the optional `redis` package.
+- `NullCache`: caching disabled.
+
+The backend and its limits come from `config.settings` (BOOK_CACHE_*
+environment variables).
+
+`make_search_cache` builds the cache of search result pages. Its keys
+contain the write generation from `crud.py` instead of being invalidated
+one by one, so it is always an in-process LRU (SEARCH_CACHE_MAXSIZE).
+"""
+
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+from config import Settings, settings
+
+
+class CachedResponse(NamedTuple):
+    """A serialized response body plus the headers that belong to it."""
+    body: bytes
+    headers: Dict[str, str]
+
+
+class CacheStats:
+    """Hit/miss/eviction counters of one cache instance."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def as_dict(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class NullCache:
+    """Backend that never stores anything (caching disabled)."""
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    async def get(self, key) -> Optional[CachedResponse]:
+        self.stats.misses += 1
+        return None
+
+    async def set(self, key, value: CachedResponse) -> None:
+        pass
+
+    async def delete(self, key) -> None:
+        pass
+
+    async def clear(self) -> None:
+        pass
+
+    async def snapshot(self) -> Dict[str, float]:
+        return {**self.stats.as_dict(), "size": 0}
+
+
+class LRUCache:
+    """Bounded in-process LRU cache whose entries also expire after `ttl` seconds.
+
+    An OrderedDict keeps entries in recency order: hits move the key to the
+    end, and inserts beyond `maxsize` evict from the front. Expired entries
+    are dropped lazily when they are looked up (and counted as misses).
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    async def get(self, key) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    async def set(self, key, value: CachedResponse) -> None:
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def delete(self, key) -> None:
+        self._entries.pop(key, None)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+    async def snapshot(self) -> Dict[str, float]:
+        return {**self.stats.as_dict(), "size": len(self._entries)}
+
+
+class RedisCache:
+    """Cache stored in a Redis-compatible server, shared between worker processes.
+
+    Hit/miss counters are per process; evictions are the server's own
+    `evicted_keys` counter since Redis evicts keys on its own.
+    """
+
+    def __init__(self, url: str, ttl: float = 60.0, prefix: str = "book:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:  # optional dependency
+            raise RuntimeError("BOOK_CACHE_BACKEND=redis requires the 'redis' package")
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats = CacheStats()
+        self._client = redis.from_url(url)
+
+    def _key(self, key) -> str:
+        return f"{self.prefix}{key}"
+
+    async def get(self, key) -> Optional[CachedResponse]:
+        raw = await self._client.get(self._key(key))
+        if raw is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        # Stored as one line of JSON headers followed by the raw body
+        headers, _, body = raw.partition(b"\n")
+        return CachedResponse(body, json.loads(headers))
+
+    async def set(self, key, value: CachedResponse) -> None:
+        raw = json.dumps(value.headers).encode() + b"\n" + value.body
+        await self._client.set(self._key(key), raw, px=int(self.ttl * 1000))
+
+    async def delete(self, key) -> None:
+        await self._client.delete(self._key(key))
+
+    async def clear(self) -> None:
+        async for name in self._client.scan_iter(match=f"{self.prefix}*"):
+            await self._client.delete(name)
+
+    async def snapshot(self) -> Dict[str, float]:
+        info = await self._client.info("stats")
+        self.stats.evictions = int(info.get("evicted_keys", 0))
+        return self.stats.as_dict()
+
+
+def make_cache(prefix: str = "book:", config: Settings = settings):
+    """Build the cache backend selected by `config.cache_backend`."""
+    if config.cache_backend == "none":
+        return NullCache()
+    if config.cache_backend == "redis":
+        return RedisCache(config.cache_redis_url, ttl=config.cache_ttl, prefix=prefix)
+    if config.cache_backend == "memory":
+        return LRUCache(maxsize=config.cache_maxsize, ttl=config.cache_ttl)
+    raise ValueError(f"Unknown BOOK_CACHE_BACKEND: {config.cache_backend!r}")
+
+
+def make_search_cache(config: Settings = settings):
+    """Build the in-process cache of search results (disabled with SEARCH_CACHE_MAXSIZE=0)."""
+    if config.cache_backend == "none" or config.search_cache_maxsize <= 0:
+        return NullCache()
+    return LRUCache(maxsize=config.search_cache_maxsize, ttl=config.cache_ttl)
@@ -0,0 +1,141 @@
+"""
+Negotiated response compression (zstd, brotli, gzip).
+
+`CompressionMiddleware` compresses complete responses whose body is at
+least COMPRESSION_MIN_SIZE bytes and whose content type is text-like
+(JSON, NDJSON, CSV, text). The encoding is picked from the client's
+`Accept-Encoding` (q-values respected); on ties the server prefers zstd,
+then brotli, then gzip. brotli and zstd are optional dependencies
+(`brotli` / `zstandard` packages): without them only gzip is offered.
+
+Compressing a large page is CPU work that would stall every other request
+on the event loop, so bodies of COMPRESSION_THREAD_MIN_SIZE bytes or more
+are compressed in a worker thread (`anyio.to_thread`).
+
+Streaming responses (e.g. `/books/export`) are passed through untouched:
+they are sent in several chunks and compressing them would mean either
+buffering the whole export or giving up on Content-Length.
+
+A compressed body is a different representation, so a strong ETag is
+weakened (`W/"..."`) as HTTP requires; conditional GETs still match.
+"""
+
+import gzip
+from typing import Callable, Dict, Optional
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+
+from config import Settings, settings
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def _compressors(config: Settings) -> Dict[str, Callable[[bytes], bytes]]:
+    """Available encodings in server preference order."""
+    compressors = {}
+    if zstandard is not None:
+        compressors["zstd"] = zstandard.ZstdCompressor(level=config.compression_zstd_level).compress
+    if brotli is not None:
+        compressors["br"] = lambda body: brotli.compress(body, quality=config.compression_brotli_quality)
+    compressors["gzip"] = lambda body: gzip.compress(body, compresslevel=config.compression_gzip_level, mtime=0)
+    return compressors
+
+
+def negotiate(accept_encoding: str, available) -> Optional[str]:
+    """Pick the encoding for an Accept-Encoding header, or None for identity.
+
+    `available` is ordered by server preference, which breaks q-value ties.
+    """
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing complete text-like responses (see module docstring)."""
+
+    def __init__(self, app, config: Settings = settings):
+        self.app = app
+        self.minimum_size = config.compression_min_size
+        self.thread_min_size = config.compression_thread_min_size
+        self.compressors = _compressors(config)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.compressors)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(scope=start)
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            ):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            compress = self.compressors[encoding]
+            if len(body) >= self.thread_min_size:
+                body = await anyio.to_thread.run_sync(compress, body)
+            else:
+                body = compress(body)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            passthrough = True
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
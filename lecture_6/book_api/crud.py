@@ -6,14 +6,64 @@ operation using SQLAlchemy Core/ORM async APIs (select/execute/commit).
 All functions are fully asynchronous and documented for grading.
 """
 
-from typing import List, Optional
-from sqlalchemy import select
+from datetime import datetime
+from typing import Any, AsyncIterator, Mapping, Optional, Sequence, Tuple
+from sqlalchemy import Row, and_, delete, func, insert, or_, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from models import Book
+from pagination import InvalidCursor, decode_cursor
+import fts
 import models
 import schemas
 
 
+class DuplicateBook(ValueError):
+    """Raised when an update would collide with another book's (title, author, year)."""
+
+
+# Columns returned by the list/search queries, in row order. Those endpoints
+# read plain tuples instead of ORM objects (see responses.py); version and
+# updated_at only feed the page ETag.
+ROW_COLUMNS = ("id", "title", "author", "year", "version", "updated_at")
+
+# Columns written by the export endpoint
+EXPORT_COLUMNS = ("id", "title", "author", "year")
+
+
+# Bumped after every committed write made through this module. Caches of
+# query results (the search cache in main.py) put it in their keys, so one
+# write makes every older entry unreachable. It is per process: with several
+# workers, writes handled by another worker are only seen once entries expire.
+_write_generation = 0
+
+
+def write_generation() -> int:
+    """Return the current write generation (see `_write_generation`)."""
+    return _write_generation
+
+
+def _bump_write_generation() -> None:
+    global _write_generation
+    _write_generation += 1
+
+
+def normalize_search_text(text: Optional[str]) -> Optional[str]:
+    """Lower-case and trim a title/author filter; blank filters become None.
+
+    Search is case-insensitive either way, so normalized filters return the
+    same books and can share one cache entry.
+    """
+    if text is None:
+        return None
+    text = text.strip().lower()
+    return text or None
+
+
+def _select_rows(columns=ROW_COLUMNS):
+    return select(*(getattr(models.Book, name) for name in columns))
+
+
 async def get_book(db: AsyncSession, book_id: int) -> Optional[models.Book]:
     """Return a single Book by id or None if not found.
 
@@ -24,77 +74,278 @@ async def get_book(db: AsyncSession, book_id: int) -> Optional[models.Book]:
     return result.scalars().first()
 
 
-async def get_books(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[models.Book]:
-    """Return a list of books with pagination (skip/limit)."""
-    stmt = select(models.Book).offset(skip).limit(limit)
+def _order_by(stmt, sort: str):
+    """Order by `sort` then `id`; NULL years sort last on every database."""
+    if sort == "id":
+        return stmt.order_by(models.Book.id)
+    sort_column = getattr(models.Book, sort)
+    if sort == "year":
+        return stmt.order_by(sort_column.asc().nulls_last(), models.Book.id)
+    return stmt.order_by(sort_column, models.Book.id)
+
+
+def _seek(stmt, sort: str, after: str):
+    """Keep only rows after the cursor `after` in the `_order_by(sort)` order."""
+    value, last_id = decode_cursor(after, sort)
+    if sort == "id":
+        return stmt.where(models.Book.id > last_id)
+    sort_column = getattr(models.Book, sort)
+    if sort == "year":
+        # Row values never compare with NULL, so the NULL tail is handled apart
+        if value is None:
+            return stmt.where(sort_column.is_(None), models.Book.id > last_id)
+        return stmt.where(or_(sort_column.is_(None), tuple_(sort_column, models.Book.id) > tuple_(value, last_id)))
+    # Row-value comparison lets SQLite seek the (sort_column, rowid) index
+    return stmt.where(tuple_(sort_column, models.Book.id) > tuple_(value, last_id))
+
+
+async def get_books_by_ids(db: AsyncSession, ids: Sequence[int]) -> Sequence[Row]:
+    """Return the (id, title, author, year, ...) rows of the given ids with one `IN` query.
+
+    Rows come back in no particular order and missing ids are simply absent;
+    the caller matches them to the requested ids.
+    """
+    if not ids:
+        return []
+    result = await db.execute(_select_rows().where(models.Book.id.in_(ids)))
+    return result.all()
+
+
+async def get_books(
+    db: AsyncSession, skip: int = 0, limit: int = 100, after: Optional[str] = None, sort: str = "id"
+) -> Sequence[Row]:
+    """Return a page of (id, title, author, year) rows ordered by `sort` (then `id`).
+
+    Without `after` this is classic offset pagination (skip/limit). With an
+    `after` cursor (see `pagination.py`) the query seeks directly past the
+    last row of the previous page instead of scanning and discarding rows,
+    so deep pages cost the same as the first one. Raises InvalidCursor for
+    a bad token.
+    """
+    stmt = _order_by(_select_rows(), sort)
+    if after is not None:
+        stmt = _seek(stmt, sort, after)
+    else:
+        stmt = stmt.offset(skip)
+
+    stmt = stmt.limit(limit)
     result = await db.execute(stmt)
-    return result.scalars().all()
+    return result.all()
 
 
-async def search_books(
-    db: AsyncSession, title: Optional[str] = None, author: Optional[str] = None, year: Optional[int] = None
-) -> List[models.Book]:
-    """Search books by partial title, partial author (case-insensitive) and exact year.
+async def stream_books(db: AsyncSession, batch_size: int = 1000) -> AsyncIterator[Sequence[tuple]]:
+    """Yield all books ordered by id as batches of (id, title, author, year) tuples.
+
+    `db.stream()` with `yield_per` fetches `batch_size` rows at a time from
+    the database cursor (a server-side cursor on PostgreSQL) instead of
+    loading the whole table, and plain column tuples skip ORM object
+    construction. Memory use is bounded by one batch.
+    """
+    stmt = _select_rows(EXPORT_COLUMNS).order_by(models.Book.id).execution_options(yield_per=batch_size)
+    result = await db.stream(stmt)
+    async for partition in result.partitions():
+        yield partition
+
+
+async def _filter_search(db: AsyncSession, stmt, title: Optional[str], author: Optional[str], year: Optional[int]):
+    """Add the search filters to `stmt`.
 
-    This function builds a dynamic query depending on the provided parameters.
+    Returns the statement and the relevance expression to order by, which
+    is None when the query does not go through the FTS index.
     """
-    stmt = select(models.Book)
+    match = fts.build_match(title, author)
+    if match is not None and await fts.available(db):
+        stmt = stmt.join(fts.books_fts, fts.books_fts.c.rowid == models.Book.id).where(fts.match_clause(match))
+        relevance = fts.rank()
+    else:
+        relevance = None
+        if title:
+            # Use ilike for case-insensitive partial matching
+            stmt = stmt.where(models.Book.title.ilike(f"%{title}%"))
+        if author:
+            stmt = stmt.where(models.Book.author.ilike(f"%{author}%"))
 
-    if title:
-        # Use ilike for case-insensitive partial matching
-        stmt = stmt.where(models.Book.title.ilike(f"%{title}%"))
-    if author:
-        stmt = stmt.where(models.Book.author.ilike(f"%{author}%"))
     if year is not None:
         stmt = stmt.where(models.Book.year == year)
+    return stmt, relevance
 
+
+async def search_books(
+    db: AsyncSession,
+    title: Optional[str] = None,
+    author: Optional[str] = None,
+    year: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = None,
+    sort: str = "relevance",
+) -> Sequence[Row]:
+    """Search books by title, author (case-insensitive) and exact year.
+
+    Returns one page of (id, title, author, year) rows: at most `limit`,
+    after skipping `skip` rows or seeking past the `after` cursor.
+
+    When the FTS5 index from `fts.py` is present, title/author are matched
+    per token by prefix ("pot" finds "Harry Potter") through the index.
+    Otherwise (other databases, no FTS5, or a filter made only of
+    punctuation) the query falls back to ILIKE substring matching, which
+    has to scan the table.
+
+    `sort` is "id", "title", "year" or "relevance": bm25 order for FTS
+    matches, id order for any other search. Cursors work with every sort
+    except relevance (InvalidCursor).
+    """
+    stmt, relevance = await _filter_search(db, _select_rows(), title, author, year)
+    if sort == "relevance":
+        if after is not None:
+            raise InvalidCursor("Cursors are not supported with sort='relevance'; use skip")
+        stmt = stmt.order_by(relevance, models.Book.id) if relevance is not None else stmt.order_by(models.Book.id)
+    else:
+        stmt = _order_by(stmt, sort)
+
+    if after is not None:
+        stmt = _seek(stmt, sort, after)
+    else:
+        stmt = stmt.offset(skip)
+
+    result = await db.execute(stmt.limit(limit))
+    return result.all()
+
+
+async def count_search_books(
+    db: AsyncSession, title: Optional[str] = None, author: Optional[str] = None, year: Optional[int] = None
+) -> int:
+    """Return how many books `search_books` would find over all pages.
+
+    A bare `SELECT count(*)` with the same filters: no columns are read and
+    nothing is sorted, so only callers that ask for a total pay for it.
+    """
+    stmt, _ = await _filter_search(db, select(func.count()).select_from(models.Book), title, author, year)
     result = await db.execute(stmt)
-    return result.scalars().all()
+    return result.scalar_one()
 
 
-async def create_book(db: AsyncSession, book: schemas.BookCreate) -> models.Book:
+async def create_book(db: AsyncSession, book: schemas.BookCreate) -> Optional[models.Book]:
     """Create a new Book record and return the ORM object.
 
-    We add the object to the session, commit the transaction and refresh
-    to populate auto-generated fields (like `id`).
+    Issues a single `INSERT ... RETURNING` so the generated `id` comes back
+    without a separate refresh. The unique indexes on (title, author, year)
+    decide whether the book is a duplicate: in that case the transaction is
+    rolled back and None is returned. Because the database enforces it, two
+    concurrent requests can no longer both create the same book.
     """
-    db_book = models.Book(title=book.title, author=book.author, year=book.year)
-    db.add(db_book)
-    # commit persists the change to the DB
-    await db.commit()
-    # refresh loads any DB-generated defaults into db_book (e.g., id)
-    await db.refresh(db_book)
+    stmt = insert(models.Book).values(title=book.title, author=book.author, year=book.year).returning(models.Book)
+    try:
+        result = await db.execute(stmt)
+        db_book = result.scalar_one()
+        # commit persists the change to the DB
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return None
+    _bump_write_generation()
     return db_book
 
 
-async def update_book(db: AsyncSession, db_book: models.Book, updates: schemas.BookUpdate) -> models.Book:
-    """Update fields on an existing Book ORM instance and persist changes.
+# Dialect-specific INSERT constructs that support ON CONFLICT DO NOTHING
+_INSERT_ON_CONFLICT = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
 
-    Receives an already-loaded ORM object (db_book). Only non-None fields
-    from `updates` are applied. After commit, the object is refreshed.
+async def insert_books(db: AsyncSession, rows: Sequence[Mapping[str, Any]]) -> int:
+    """Insert rows (dicts with title/author/year) in one batched statement, without committing.
+
+    Runs `INSERT ... ON CONFLICT DO NOTHING RETURNING id` with all rows
+    (SQLAlchemy batches them into multi-row VALUES), so books that already
+    exist, or repeat inside the batch, are skipped by the unique indexes.
+    Returns the number of rows actually created.
     """
-    if updates.title is not None:
-        db_book.title = updates.title
-    if updates.author is not None:
-        db_book.author = updates.author
-    if updates.year is not None:
-        db_book.year = updates.year
-
-    db.add(db_book)
-    await db.commit()
-    await db.refresh(db_book)
-    return db_book
+    if not rows:
+        return 0
+    dialect_insert = _INSERT_ON_CONFLICT[db.get_bind().dialect.name]
+    stmt = dialect_insert(models.Book.__table__).on_conflict_do_nothing().returning(models.Book.id)
+    result = await db.execute(stmt, rows)
+    return len(result.all())
+
 
+async def bulk_create_books(db: AsyncSession, books: Sequence[schemas.BookCreate]) -> int:
+    """Insert a chunk of books with `insert_books` and commit it.
 
-async def delete_book(db: AsyncSession, db_book: models.Book) -> None:
-    """Delete a Bсвook ORM object from the database."""
-    await db.delete(db_book)
+    Returns the number of rows actually created; the caller derives the
+    skipped count from the chunk size.
+    """
+    created = await insert_books(db, [{"title": b.title, "author": b.author, "year": b.year} for b in books])
     await db.commit()
+    if created:
+        _bump_write_generation()
+    return created
+
+
+def _has_etag(expected: Sequence[Tuple[int, Optional[datetime]]]):
+    """WHERE clause: the row's (version, updated_at) is one of the `expected` pairs."""
+    return or_(*(
+        and_(
+            models.Book.version == version,
+            models.Book.updated_at.is_(None) if updated_at is None else models.Book.updated_at == updated_at,
+        )
+        for version, updated_at in expected
+    ))
+
+
+async def update_book(
+    db: AsyncSession,
+    book_id: int,
+    updates: schemas.BookUpdate,
+    expected: Optional[Sequence[Tuple[int, Optional[datetime]]]] = None,
+) -> Optional[models.Book]:
+    """Apply a partial update with one `UPDATE ... WHERE id = ? RETURNING ...`.
+
+    Only non-None fields from `updates` are written; `version` is bumped and
+    `updated_at` refreshed (column onupdate) in the same statement, so no
+    prior load or refresh is needed. With `expected` (version, updated_at)
+    pairs, see `responses.if_match_tags`, the row is only updated if it
+    still has one of them (optimistic concurrency).
 
+    Returns the updated Book, or None if no row matched (missing id or
+    precondition failed). Raises DuplicateBook if the new values collide with
+    another book.
+    """
+    values = updates.model_dump(exclude_none=True)
+    if not values:
+        # Nothing to change: do not bump the version, just report the row
+        stmt = select(models.Book).where(models.Book.id == book_id)
+        if expected is not None:
+            stmt = stmt.where(_has_etag(expected))
+        return (await db.execute(stmt)).scalars().first()
 
-async def get_book_by_unique_fields(db: AsyncSession, title: str, author: str, year: int):
-    """Check if a book with the given title, author, and year exists."""
-    result = await db.execute(
-        select(Book).where(Book.title == title, Book.author == author, Book.year == year)
+    stmt = (
+        update(models.Book)
+        .where(models.Book.id == book_id)
+        .values(**values, version=models.Book.version + 1)
+        .returning(models.Book)
+        .execution_options(synchronize_session=False)
     )
-    return result.scalars().first()
+    if expected is not None:
+        stmt = stmt.where(_has_etag(expected))
+    try:
+        result = await db.execute(stmt)
+        db_book = result.scalar_one_or_none()
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise DuplicateBook("Book with this title, author and year already exists")
+    if db_book is not None:
+        _bump_write_generation()
+    return db_book
+
+
+async def delete_book(db: AsyncSession, book_id: int) -> bool:
+    """Delete a book with one `DELETE ... WHERE id = ? RETURNING id`.
+
+    Returns False if there was no such book.
+    """
+    result = await db.execute(delete(models.Book).where(models.Book.id == book_id).returning(models.Book.id))
+    deleted = result.scalar_one_or_none() is not None
+    await db.commit()
+    if deleted:
+        _bump_write_generation()
+    return deleted
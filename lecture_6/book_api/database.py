@@ -3,25 +3,123 @@ Async database setup using SQLAlchemy and SQLite (aiosqlite).
 
 
 This module creates an async engine and an async session factory that
-other modules import to obtain AsyncSession instances. We use
-`sqlite+aiosqlite:///./books.db` connection URL for a local file DB.
+other modules import to obtain AsyncSession instances. The connection URL,
+pool sizing and SQLite pragmas come from `config.settings` (environment
+variables); by default it is the local file DB `sqlite+aiosqlite:///./books.db`.
+PostgreSQL works too through `postgresql+asyncpg://...`.
 
 
 All functions and endpoints that interact with the DB should use
 `AsyncSession` from this module via dependency injection.
+
+Read replicas (DATABASE_REPLICA_URLS) get their own engines in `replicas`,
+a `ReplicaRouter` that hands out sessions round-robin; `main.get_read_db`
+routes read-only endpoints through it. Replication itself is the
+database's job: locally, several SQLite files or containers can stand in.
+
+Every engine made by `make_engine` is instrumented: each SQL statement is
+timed by cursor-execute event hooks and reported to `metrics.record_query`.
 """
 
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+import itertools
+import time
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 
+from config import Settings, settings
+import metrics
+
+
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
+def _sqlite_pragmas(config: Settings):
+    """Return the PRAGMA statements to run on every new SQLite connection."""
+    if config.sqlite_journal_mode not in _JOURNAL_MODES:
+        raise ValueError(f"Unsupported SQLITE_JOURNAL_MODE: {config.sqlite_journal_mode!r}")
+    if config.sqlite_synchronous not in _SYNCHRONOUS_MODES:
+        raise ValueError(f"Unsupported SQLITE_SYNCHRONOUS: {config.sqlite_synchronous!r}")
+    return [
+        # busy_timeout first, so switching to WAL waits for other connections
+        f"PRAGMA busy_timeout = {int(config.sqlite_busy_timeout_ms)}",
+        f"PRAGMA journal_mode = {config.sqlite_journal_mode}",
+        f"PRAGMA synchronous = {config.sqlite_synchronous}",
+        f"PRAGMA cache_size = {int(config.sqlite_cache_size)}",
+        f"PRAGMA mmap_size = {int(config.sqlite_mmap_size)}",
+    ]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # A stack, because a statement can trigger nested ones (e.g. inside events)
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    metrics.record_query(statement, time.perf_counter() - started)
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.connection is not None:
+        started = context.connection.info.get("query_started")
+        if started:
+            started.pop()
+
+
+def instrument(sync_engine) -> None:
+    """Attach the SQL timing hooks to a (sync) Engine."""
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
 
-# Async connection URL for SQLite using aiosqlite driver.
-DATABASE_URL = "sqlite+aiosqlite:///./books.db"
 
+def make_engine(url: Optional[str] = None, config: Settings = settings) -> AsyncEngine:
+    """Create an async engine for `url` (default: DATABASE_URL) using `config`.
 
-# Create the async engine. echo=True can be enabled for SQL logging during development.
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+    - The connection pool is sized from DB_POOL_SIZE / DB_MAX_OVERFLOW /
+      DB_POOL_TIMEOUT / DB_POOL_RECYCLE. In-memory SQLite uses a single
+      static connection, so pool settings are not passed there.
+    - SQLite: every new connection gets the configured pragmas (WAL, busy
+      timeout, cache/mmap sizes) through a `connect` event listener.
+    - Statements are timed for `/metrics` (see `instrument`).
+    """
+    url = make_url(url or config.database_url)
+    kwargs = {"echo": config.db_echo, "pool_pre_ping": config.pool_pre_ping}
+    is_memory_sqlite = url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+    if not is_memory_sqlite:
+        kwargs.update(
+            pool_size=config.pool_size,
+            max_overflow=config.max_overflow,
+            pool_timeout=config.pool_timeout,
+            pool_recycle=config.pool_recycle,
+        )
+
+    async_engine = create_async_engine(url, **kwargs)
+    instrument(async_engine.sync_engine)
+
+    if url.get_backend_name() == "sqlite":
+        pragmas = _sqlite_pragmas(config)
+
+        @event.listens_for(async_engine.sync_engine, "connect")
+        def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+    return async_engine
+
+
+# Application engine built from the environment (see config.py)
+DATABASE_URL = settings.database_url
+engine = make_engine(DATABASE_URL)
 
 
 # Async session factory. expire_on_commit=False prevents attributes from being expired
@@ -29,5 +127,33 @@ engine = create_async_engine(DATABASE_URL, echo=False, future=True)
 AsyncSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
 
 
+class ReplicaRouter:
+    """Round-robin session factory over the read replica engines.
+
+    `session()` returns None when no replica is configured, so callers
+    fall back to the primary.
+    """
+
+    def __init__(self, urls: List[str], config: Settings = settings):
+        self.engines = [make_engine(url, config) for url in urls]
+        factories = [
+            async_sessionmaker(bind=replica, expire_on_commit=False, class_=AsyncSession) for replica in self.engines
+        ]
+        self._factories = itertools.cycle(factories) if factories else None
+
+    def session(self) -> Optional[AsyncSession]:
+        if self._factories is None:
+            return None
+        return next(self._factories)()
+
+    async def dispose(self) -> None:
+        for replica in self.engines:
+            await replica.dispose()
+
+
+# Replica engines built from DATABASE_REPLICA_URLS (none by default)
+replicas = ReplicaRouter(settings.database_replica_urls)
+
+
 # Declarative base for ORM models (shared across modules)
 Base = declarative_base()
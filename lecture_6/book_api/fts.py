@@ -0,0 +1,146 @@
+"""
+SQLite FTS5 full-text index mirroring the `books` table.
+
+`Book.title.ilike('%x%')` cannot use a B-tree index because of the leading
+wildcard, so every search used to be a full table scan. This module keeps
+an external-content FTS5 table (`books_fts`) in sync with `books` through
+triggers, so every write path (ORM, bulk inserts, raw SQL) updates it
+without any extra code in `crud.py`.
+
+The index is installed by a step in `migrations.py` on existing databases
+and whenever `Base.metadata.create_all` runs (see the listener at the
+bottom), and is simply skipped on databases that are not
+SQLite or whose SQLite build lacks FTS5; `crud.search_books` then falls
+back to the ILIKE query.
+"""
+
+import re
+import weakref
+from typing import Optional
+
+from sqlalchemy import column, event, func, literal_column, table
+from sqlalchemy.exc import OperationalError
+
+from database import Base
+
+
+FTS_TABLE = "books_fts"
+
+# Lightweight (non-ORM) handle used to join against the virtual table
+books_fts = table(FTS_TABLE, column("rowid"))
+
+_CREATE_STATEMENTS = (
+    # External-content table: only the inverted index is stored, the text
+    # itself is read from `books` by rowid.
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    "title, author, content='books', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON books BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, author) VALUES (new.id, new.title, new.author); "
+    "END",
+    f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON books BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author) "
+    "VALUES ('delete', old.id, old.title, old.author); "
+    "END",
+    f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF title, author ON books BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author) "
+    "VALUES ('delete', old.id, old.title, old.author); "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, author) VALUES (new.id, new.title, new.author); "
+    "END",
+    # Index rows that existed before the FTS table was created
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+
+# Cache of "does this engine have the FTS table?" so searches do not have
+# to query sqlite_master on every request.
+_available = weakref.WeakKeyDictionary()
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def is_installed(connection) -> bool:
+    """Return True if the FTS table exists on this (sync) connection."""
+    if connection.dialect.name != "sqlite":
+        return False
+    row = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).first()
+    return row is not None
+
+
+def install(connection) -> bool:
+    """Create the FTS table and its sync triggers if they do not exist yet.
+
+    Safe to call repeatedly. Returns True when the index is available.
+    """
+    if connection.dialect.name != "sqlite":
+        return False
+    if is_installed(connection):
+        return True
+    try:
+        for statement in _CREATE_STATEMENTS:
+            connection.exec_driver_sql(statement)
+    except OperationalError:
+        # SQLite compiled without FTS5: searches keep using ILIKE
+        return False
+    _available.pop(connection.engine, None)
+    return True
+
+
+def uninstall(connection) -> None:
+    """Drop the FTS table; its triggers are dropped together with `books`."""
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        _available.pop(connection.engine, None)
+
+
+async def available(db) -> bool:
+    """Return True if the database behind AsyncSession `db` has the FTS index."""
+    engine = db.get_bind()
+    cached = _available.get(engine)
+    if cached is None:
+        cached = await db.run_sync(lambda session: is_installed(session.connection()))
+        _available[engine] = cached
+    return cached
+
+
+def _column_query(field: str, text: Optional[str]) -> Optional[str]:
+    """Turn user text into `field : ("tok1"* AND "tok2"*)` (prefix match per token)."""
+    if not text:
+        return None
+    tokens = _TOKEN_RE.findall(text)
+    if not tokens:
+        return None
+    return f"{field} : (" + " AND ".join(f'"{token}"*' for token in tokens) + ")"
+
+
+def match_clause(match: str):
+    """Return the `books_fts MATCH :match` WHERE clause."""
+    return literal_column(FTS_TABLE).op("MATCH")(match)
+
+
+def rank():
+    """Return the bm25() relevance expression (lower is better)."""
+    return func.bm25(literal_column(FTS_TABLE))
+
+
+def build_match(title: Optional[str], author: Optional[str]) -> Optional[str]:
+    """Build an FTS5 MATCH expression for the given filters.
+
+    Returns None when a provided filter has no searchable tokens (e.g. only
+    punctuation); the caller should then use the ILIKE query instead.
+    """
+    parts = []
+    for field, text in (("title", title), ("author", author)):
+        if text:
+            query = _column_query(field, text)
+            if query is None:
+                return None
+            parts.append(query)
+    return " AND ".join(parts) if parts else None
+
+
+# Keep the index next to the schema: every create_all installs it (idempotently)
+# and drop_all removes it before `books` goes away.
+event.listen(Base.metadata, "after_create", lambda target, connection, **kw: install(connection))
+event.listen(Base.metadata, "before_drop", lambda target, connection, **kw: uninstall(connection))
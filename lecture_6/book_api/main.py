@@ -5,32 +5,65 @@ All endpoints are `async def` and use `AsyncSession` via dependency injection.
 Detailed English comments are added to each endpoint for graders.
 """
 
-from fastapi import FastAPI, Depends, HTTPException, Query
-from typing import List, Optional
+import asyncio
+import csv
+import io
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import AsyncIterator, List, Literal, Optional
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import engine, AsyncSessionLocal, Base
+from config import settings
+from database import engine, replicas, AsyncSessionLocal
+from pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, InvalidCursor, SearchSortKey, SortKey, next_cursor
+from responses import (
+    FastJSONResponse, book_etag, book_rows, cache_control, dumps, etag_matches, if_match_tags, page_etag,
+    validator_headers,
+)
+from cache import CachedResponse, make_cache, make_search_cache
+from compression import CompressionMiddleware
+from singleflight import SingleFlight
+import metrics
+import migrations
 import schemas
 import crud
 
-# Create database tables if they do not exist. For async engines, we run
-# metadata.create_all() in a synchronous context using run_sync.
-# This operation is performed here once at startup so the DB file and
-# schema are present before handling requests.
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Bring the schema up to date before serving requests. When it already is,
+    # this is a single SELECT of the recorded version (see migrations.py).
+    if settings.migrate_on_startup:
+        await migrations.migrate(engine)
+    # Keep a reference so the background task is not garbage collected
+    app.state.loop_monitor = asyncio.create_task(metrics.monitor_event_loop())
+    yield
+    app.state.loop_monitor.cancel()
+    await replicas.dispose()
+    await engine.dispose()
 
-async def _create_db_and_tables():
-    # Use engine.begin() and run_sync to create tables synchronously in the DB.
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
 
+app = FastAPI(title="Async Book Collection API", lifespan=lifespan)
 
-app = FastAPI(title="Async Book Collection API")
+# gzip/brotli/zstd for large JSON/CSV bodies (COMPRESSION_* settings). Added
+# first so it runs inside the metrics middleware and its cost is measured.
+app.add_middleware(CompressionMiddleware)
 
+# Per-route latency histograms and per-request SQL counts/time for /metrics
+app.add_middleware(metrics.MetricsMiddleware)
 
-# Register startup event to create tables before serving requests.
-@app.on_event("startup")
-async def on_startup():
-    await _create_db_and_tables()
+# Read-through cache of serialized BookOut JSON keyed by book id
+# (backend selected by BOOK_CACHE_* environment variables, see config.py).
+book_cache = make_cache(prefix="book:")
+
+# Serialized search result pages keyed by (write generation, normalized
+# title, author, year); see crud.write_generation.
+search_cache = make_search_cache()
+
+# Concurrent cache misses for the same book / search share one query
+book_flights = SingleFlight("book")
+search_flights = SingleFlight("search")
 
 
 # Dependency that yields an AsyncSession for each request. Using `async with`
@@ -40,62 +73,454 @@ async def get_db() -> AsyncSession:
         yield session
 
 
+# Cookie marking a client that wrote recently, so its reads see its writes
+READ_YOUR_WRITES_COOKIE = "book_api_primary"
+
+# Session.info flags set by `get_read_db`: on the primary session of such a
+# client, and on every replica session
+PINNED_TO_PRIMARY = "pinned_to_primary"
+FROM_REPLICA = "from_replica"
+
+
+def _from_replica(db: AsyncSession) -> bool:
+    """True for reads served by a replica: they may trail the primary, so they never fill the caches."""
+    return db.info.get(FROM_REPLICA, False)
+
+
+def _is_private(db: AsyncSession, authorization: Optional[str]) -> bool:
+    """True for pages shared caches must not keep: with credentials, or for a read-your-writes client."""
+    return authorization is not None or db.info.get(PINNED_TO_PRIMARY, False)
+
+
+async def get_read_db(request: Request, db: AsyncSession = Depends(get_db)) -> AsyncSession:
+    """Session for read-only endpoints: a replica (round-robin) when configured.
+
+    Falls back to the primary session from `get_db` when there are no
+    replicas, or when the client wrote within READ_YOUR_WRITES_SECONDS
+    (it still carries the cookie set by `get_write_db`) and a lagging
+    replica could miss its own write. The primary session is only created,
+    never connected, when a replica serves the request.
+
+    Replica sessions are marked (FROM_REPLICA) and never fill `book_cache`
+    or `search_cache`: an entry read from a lagging replica would outlive
+    the write invalidation and be served, even to the writer, until it
+    expired. The caches therefore only hold rows read from the primary.
+    Pages read by a client carrying the cookie are marked private (see
+    `_is_private`), so its browser does not keep a page from before its write.
+    """
+    if READ_YOUR_WRITES_COOKIE in request.cookies:
+        db.info[PINNED_TO_PRIMARY] = True
+        yield db
+        return
+    replica = replicas.session()
+    if replica is None:
+        yield db
+        return
+    replica.info[FROM_REPLICA] = True
+    async with replica:
+        yield replica
+
+
+async def get_write_db(response: Response, db: AsyncSession = Depends(get_db)) -> AsyncSession:
+    """Session for writing endpoints: always the primary.
+
+    With replicas configured, the response also sets the read-your-writes
+    cookie, so the client's next reads go to the primary for a while.
+    """
+    if replicas.engines and settings.read_your_writes_seconds > 0:
+        response.set_cookie(
+            READ_YOUR_WRITES_COOKIE, "1", max_age=settings.read_your_writes_seconds, httponly=True, samesite="lax"
+        )
+    yield db
+
+
 @app.post("/books/", response_model=schemas.BookOut, status_code=201)
-async def create_book_endpoint(book: schemas.BookCreate, db: AsyncSession = Depends(get_db)):
+async def create_book_endpoint(book: schemas.BookCreate, db: AsyncSession = Depends(get_write_db)):
     """Create a book record, preventing duplicates.
 
     - Validates incoming payload via BookCreate schema.
-    - Checks if a book with the same title, author, and year already exists.
-    - If exists, raises HTTP 409 Conflict.
-    - Otherwise, creates the book and returns BookOut (includes generated id).
+    - Inserts the book with a single statement; the unique indexes on
+      (title, author, year) reject duplicates, even under concurrent POSTs.
+    - If the book already exists, raises HTTP 409 Conflict.
+    - Otherwise, returns BookOut (includes generated id).
     """
-    # Check if book already exists
-    existing_book = await crud.get_book_by_unique_fields(db, book.title, book.author, book.year)
-    if existing_book:
+    created = await crud.create_book(db, book)
+    if created is None:
         raise HTTPException(
             status_code=409,
             detail="Book with this title, author and year already exists"
         )
-
-    # Create new book
-    created = await crud.create_book(db, book)
     return created
 
 
+# Content types accepted as newline-delimited JSON by the bulk endpoint
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+class BulkPayloadError(ValueError):
+    """Raised for an unparsable or invalid item in a bulk request body."""
+
+    def __init__(self, item: int, errors):
+        super().__init__(f"Invalid book at item {item}")
+        self.item = item
+        self.errors = errors
+
+
+def _parse_bulk_line(line: bytes, item: int) -> schemas.BookCreate:
+    try:
+        return schemas.BookCreate.model_validate_json(line)
+    except ValidationError as e:
+        raise BulkPayloadError(item, e.errors(include_url=False, include_context=False, include_input=False))
+
+
+async def _iter_bulk_books(request: Request) -> AsyncIterator[schemas.BookCreate]:
+    """Yield validated BookCreate items from a JSON array or NDJSON body.
+
+    NDJSON is parsed line by line while the body is still arriving, so a
+    huge upload never has to be held in memory as a whole.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_MEDIA_TYPES:
+        item = 0
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    item += 1
+                    yield _parse_bulk_line(line, item)
+        if buffer.strip():
+            yield _parse_bulk_line(buffer, item + 1)
+        return
+
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise BulkPayloadError(0, "Body must be a JSON array or NDJSON")
+    if not isinstance(payload, list):
+        raise BulkPayloadError(0, "Body must be a JSON array or NDJSON")
+    for item, raw in enumerate(payload, start=1):
+        try:
+            yield schemas.BookCreate.model_validate(raw)
+        except ValidationError as e:
+            raise BulkPayloadError(item, e.errors(include_url=False, include_context=False, include_input=False))
+
+
+@app.post(
+    "/books/bulk",
+    response_model=schemas.BulkCreateResult,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"type": "array", "items": {"$ref": "#/components/schemas/BookCreate"}}
+                },
+                "application/x-ndjson": {"schema": {"$ref": "#/components/schemas/BookCreate"}},
+            },
+        }
+    },
+)
+async def bulk_create_books_endpoint(
+    request: Request,
+    chunk_size: int = Query(1000, ge=1, le=50000),
+    db: AsyncSession = Depends(get_write_db),
+):
+    """Create many books in one request.
+
+    - Accepts a JSON array of BookCreate objects, or NDJSON (one object per
+      line, `Content-Type: application/x-ndjson`) which is streamed.
+    - Rows are inserted with one batched statement per `chunk_size` items and
+      each chunk is committed on its own.
+    - Books that already exist (same title, author and year), including
+      repeats inside the payload, are skipped instead of failing the request.
+    - An invalid item stops processing with 422; chunks before it stay
+      committed and the error detail reports how many rows were written.
+    """
+    created = skipped = 0
+    chunk: List[schemas.BookCreate] = []
+    try:
+        async for book in _iter_bulk_books(request):
+            chunk.append(book)
+            if len(chunk) >= chunk_size:
+                inserted = await crud.bulk_create_books(db, chunk)
+                created += inserted
+                skipped += len(chunk) - inserted
+                chunk = []
+    except BulkPayloadError as e:
+        raise HTTPException(
+            status_code=422,
+            detail={"item": e.item, "errors": e.errors, "created": created, "skipped": skipped},
+        )
+
+    inserted = await crud.bulk_create_books(db, chunk)
+    created += inserted
+    skipped += len(chunk) - inserted
+    return {"created": created, "skipped": skipped}
+
+
+def _page_validators(rows) -> dict:
+    """ETag/Last-Modified of a list page, from the ids/versions of its rows."""
+    last_modified = max((row.updated_at for row in rows if row.updated_at is not None), default=None)
+    return validator_headers(page_etag(rows), last_modified)
+
+
+def _page_response(rows, if_none_match: Optional[str], headers: Optional[dict] = None, private: bool = False) -> Response:
+    """Return a list page as JSON, or an empty 304 if the client's ETag still matches.
+
+    The ETag is computed from the ids/versions of the rows, so a matching
+    conditional GET never encodes the body. Pages that are not `private`
+    (see `_is_private`) are marked cacheable by shared caches.
+    """
+    headers = dict(headers or {})
+    headers["Cache-Control"] = cache_control(private)
+    headers.update(_page_validators(rows))
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    # Encode the rows directly instead of validating each one through BookOut
+    return FastJSONResponse(book_rows(rows), headers=headers)
+
+
+def _cached_page_response(entry: CachedResponse, if_none_match: Optional[str], private: bool = False) -> Response:
+    """Like `_page_response`, for a page already serialized into `entry`."""
+    headers = {**entry.headers, "Cache-Control": cache_control(private)}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
 @app.get("/books/", response_model=List[schemas.BookOut])
 async def read_books_endpoint(
-    skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = Query(None, description="Opaque cursor from a previous X-Next-Cursor header"),
+    sort: SortKey = Query("id"),
+    if_none_match: Optional[str] = Header(None),
+    authorization: Optional[str] = Header(None, include_in_schema=False),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Read books with pagination support.
+
+    - Offset mode: `skip` and `limit` work exactly as before.
+    - Cursor mode: pass the `X-Next-Cursor` header of the previous page as
+      `after`. The database then seeks straight to the next page through the
+      index instead of skipping rows, so deep pages stay fast.
+    A full page always carries `X-Next-Cursor`, so clients can switch to
+    cursor mode from any offset page. Combining `after` with `skip` is a 400.
+    Responses carry ETag/Last-Modified; a matching `If-None-Match` gets 304.
+    """
+    if after is not None and skip:
+        raise HTTPException(status_code=400, detail="Use either skip or after, not both")
+    try:
+        books = await crud.get_books(db, skip=skip, limit=limit, after=after, sort=sort)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {}
+    cursor = next_cursor(books, sort, limit)
+    if cursor is not None:
+        headers[NEXT_CURSOR_HEADER] = cursor
+    return _page_response(books, if_none_match, headers, _is_private(db, authorization))
+
+
+def _ndjson_chunk(rows) -> bytes:
+    return b"".join(dumps(item) + b"\n" for item in book_rows(rows))
+
+
+def _csv_chunk(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+# format -> (media type, row batch encoder, header line)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", _ndjson_chunk, b""),
+    "csv": ("text/csv; charset=utf-8", _csv_chunk, _csv_chunk([crud.EXPORT_COLUMNS])),
+}
+
+
+# Declared before /books/{book_id} so "export" is not parsed as an id.
+@app.get("/books/export")
+async def export_books_endpoint(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    batch_size: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """Read books with pagination support using query parameters `skip` and `limit`."""
-    return await crud.get_books(db, skip=skip, limit=limit)
+    """Stream the whole catalogue as NDJSON or CSV.
+
+    Rows are read from the database in batches (see crud.stream_books) and
+    every batch is encoded and sent as one chunk of a StreamingResponse, so
+    memory stays flat regardless of the table size.
+    """
+    media_type, encode, header = EXPORT_FORMATS[format]
+
+    async def body():
+        if header:
+            yield header
+        async for rows in crud.stream_books(db, batch_size=batch_size):
+            yield encode(rows)
+
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="books.{format}"'},
+    )
+
+
+def _book_entry(book) -> CachedResponse:
+    """Serialize a book (ORM object or row) as BookOut JSON with its validators, for `book_cache`."""
+    body = dumps({"title": book.title, "author": book.author, "year": book.year, "id": book.id})
+    return CachedResponse(body, validator_headers(book_etag(book.version, book.updated_at), book.updated_at))
+
+
+async def _fill_book_cache(db: AsyncSession, book_id: int, entry: CachedResponse, generation: int) -> None:
+    """Cache `entry` read through `db`, unless it came from a replica or a
+    write was committed since `generation` was read.
+
+    A read that started before a write can finish after the write's
+    `book_cache.delete`; caching its row then would bring the old version back.
+    """
+    if not _from_replica(db) and crud.write_generation() == generation:
+        await book_cache.set(book_id, entry)
+
+
+def _parse_ids(ids: str) -> List[int]:
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be a comma-separated list of integers")
+    if not parsed or len(parsed) > schemas.BATCH_MAX_IDS:
+        raise HTTPException(status_code=422, detail=f"ids must list between 1 and {schemas.BATCH_MAX_IDS} ids")
+    return parsed
+
+
+async def _batch_response(ids: List[int], db: AsyncSession) -> Response:
+    """Resolve `ids` from `book_cache`, fetch the misses with one IN query, keep the request order."""
+    ids = list(dict.fromkeys(ids))  # drop repeats, keep order
+    bodies = {}
+    for book_id in ids:
+        entry = await book_cache.get(book_id)
+        if entry is not None:
+            bodies[book_id] = entry.body
+    misses = [book_id for book_id in ids if book_id not in bodies]
+    generation = crud.write_generation()
+    for row in await crud.get_books_by_ids(db, misses):
+        entry = _book_entry(row)
+        await _fill_book_cache(db, row.id, entry, generation)
+        bodies[row.id] = entry.body
+
+    # Splice the cached JSON documents instead of decoding and re-encoding them
+    found = b",".join(bodies[book_id] for book_id in ids if book_id in bodies)
+    missing = [book_id for book_id in ids if book_id not in bodies]
+    content = b'{"books":[' + found + b'],"missing":' + dumps(missing) + b"}"
+    return Response(content=content, media_type="application/json")
+
+
+# Declared before /books/{book_id} so "batch" is not parsed as an id.
+@app.get("/books/batch", response_model=schemas.BookBatch)
+async def read_books_batch(
+    ids: str = Query(..., description="Comma-separated book ids, e.g. 1,2,3"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Get many books by id in one request.
+
+    Books are returned in the requested order (repeated ids once) and ids
+    that do not exist are listed in `missing`. Ids found in `book_cache`
+    are served from it; all others are read with a single `WHERE id IN (...)`
+    query and cached for later single or batch reads.
+    """
+    return await _batch_response(_parse_ids(ids), db)
+
+
+@app.post("/books/batch", response_model=schemas.BookBatch)
+async def read_books_batch_post(request: schemas.BookBatchRequest, db: AsyncSession = Depends(get_read_db)):
+    """Same as `GET /books/batch`, with the ids in a JSON body (for long lists)."""
+    return await _batch_response(request.ids, db)
 
 
 @app.get("/books/{book_id}", response_model=schemas.BookOut)
-async def read_book_by_id(book_id: int, db: AsyncSession = Depends(get_db)):
-    """Get a single book by its ID. Returns 404 if not found."""
-    db_book = await crud.get_book(db, book_id)
-    if not db_book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    return db_book
+async def read_book_by_id(
+    book_id: int, if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_read_db)
+):
+    """Get a single book by its ID. Returns 404 if not found.
+
+    Served from `book_cache` when possible; the session is only used on a
+    miss, and the serialized JSON is then cached together with its ETag and
+    Last-Modified headers. Missing ids are not cached. A request whose
+    `If-None-Match` matches the current ETag gets an empty 304.
+    Concurrent misses for the same id wait for one query (`book_flights`).
+    """
+    entry = await book_cache.get(book_id)
+    if entry is None:
+        generation = crud.write_generation()
+
+        async def load():
+            db_book = await crud.get_book(db, book_id)
+            if db_book is None:
+                return None
+            loaded = _book_entry(db_book)
+            await _fill_book_cache(db, book_id, loaded, generation)
+            return loaded
+
+        # Keyed by write generation too: a request arriving after a write
+        # must not be handed a load that started before it. Replica and
+        # primary reads are not merged, so a primary read never gets replica data.
+        entry = await book_flights.do((generation, _from_replica(db), book_id), load)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+
+    if etag_matches(if_none_match, entry.headers["ETag"]):
+        return Response(status_code=304, headers=entry.headers)
+    return Response(content=entry.body, media_type="application/json", headers=entry.headers)
 
 
 @app.put("/books/{book_id}", response_model=schemas.BookOut)
-async def update_book_endpoint(book_id: int, updates: schemas.BookUpdate, db: AsyncSession = Depends(get_db)):
-    """Update an existing book. Only fields provided in BookUpdate are altered."""
-    db_book = await crud.get_book(db, book_id)
-    if not db_book:
+async def update_book_endpoint(
+    book_id: int,
+    updates: schemas.BookUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_write_db),
+):
+    """Update an existing book. Only fields provided in BookUpdate are altered.
+
+    The update is a single `UPDATE ... RETURNING` statement (no prior load).
+    With `If-Match: <ETag>` (or a list of ETags) the statement only matches
+    the exact version and write time the client read, so a book changed in
+    the meantime gets 412 instead of being overwritten; so does a missing
+    book when If-Match is sent. Otherwise 404 if the book does not exist,
+    and 409 if the new values collide with another book.
+    """
+    expected = None
+    if if_match is not None:
+        try:
+            expected = if_match_tags(if_match)
+        except ValueError:
+            raise HTTPException(status_code=412, detail="Book has been modified")
+
+    try:
+        updated = await crud.update_book(db, book_id, updates, expected=expected)
+    except crud.DuplicateBook as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if updated is None:
+        # With If-Match a missing book fails the precondition too (RFC 9110 13.1.1)
+        if if_match is not None:
+            raise HTTPException(status_code=412, detail="Book has been modified")
         raise HTTPException(status_code=404, detail="Book not found")
-    updated = await crud.update_book(db, db_book, updates)
+
+    await book_cache.delete(book_id)
+    response.headers.update(validator_headers(book_etag(updated.version, updated.updated_at), updated.updated_at))
     return updated
 
 
 @app.delete("/books/{book_id}")
-async def delete_book_endpoint(book_id: int, db: AsyncSession = Depends(get_db)):
-    """Delete a book by ID. Returns success message on deletion."""
-    db_book = await crud.get_book(db, book_id)
-    if not db_book:
+async def delete_book_endpoint(book_id: int, db: AsyncSession = Depends(get_write_db)):
+    """Delete a book by ID with a single statement. Returns success message on deletion."""
+    if not await crud.delete_book(db, book_id):
         raise HTTPException(status_code=404, detail="Book not found")
-    await crud.delete_book(db, db_book)
+    await book_cache.delete(book_id)
     return {"detail": "Book deleted"}
 
 
@@ -104,12 +529,82 @@ async def search_books_endpoint(
     title: Optional[str] = Query(None),
     author: Optional[str] = Query(None),
     year: Optional[int] = Query(None),
-    db: AsyncSession = Depends(get_db),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = Query(None, description="Opaque cursor from a previous X-Next-Cursor header"),
+    sort: SearchSortKey = Query("relevance"),
+    total: bool = Query(False, description="Also return the number of matches in X-Total-Count"),
+    if_none_match: Optional[str] = Header(None),
+    authorization: Optional[str] = Header(None, include_in_schema=False),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """Search books by title, author or year (all parameters optional)."""
-    results = await crud.search_books(db, title=title, author=author, year=year)
-    # For search endpoints typically it's OK to return an empty list instead of 404.
-    return results
+    """Search books by title, author or year (all parameters optional).
+
+    Title/author go through the FTS5 index (token prefix match) when the
+    database has one, and through ILIKE otherwise; see crud.search_books.
+
+    Results are paged like `GET /books/` (at most `limit` rows, so memory is
+    bounded by the page size): `skip`, or `after` with the `X-Next-Cursor`
+    of the previous page for every sort except `relevance` (bm25 order for
+    full-text matches, id order otherwise). `total=true` adds
+    `X-Total-Count`, computed with a separate COUNT only when asked for.
+
+    Result pages are cached by the normalized (lower-cased, trimmed) filters
+    and the current write generation, so any write through crud makes older
+    entries unreachable and a cached page is never stale. Identical searches
+    running at the same time share one query (`search_flights`).
+    """
+    if after is not None and skip:
+        raise HTTPException(status_code=400, detail="Use either skip or after, not both")
+    title, author = crud.normalize_search_text(title), crud.normalize_search_text(author)
+    # Read the generation before querying: a write committed meanwhile
+    # leaves this entry under an already outdated key.
+    key = (crud.write_generation(), title, author, year, skip, limit, after, sort, total)
+    entry = await search_cache.get(key)
+    if entry is None:
+
+        async def load():
+            results = await crud.search_books(
+                db, title=title, author=author, year=year, skip=skip, limit=limit, after=after, sort=sort
+            )
+            headers = _page_validators(results)
+            if sort != "relevance":
+                cursor = next_cursor(results, sort, limit)
+                if cursor is not None:
+                    headers[NEXT_CURSOR_HEADER] = cursor
+            if total:
+                count = await crud.count_search_books(db, title=title, author=author, year=year)
+                headers[TOTAL_COUNT_HEADER] = str(count)
+            # For search endpoints typically it's OK to return an empty list instead of 404.
+            loaded = CachedResponse(dumps(book_rows(results)), headers)
+            if not _from_replica(db):
+                await search_cache.set(key, loaded)
+            return loaded
+
+        try:
+            entry = await search_flights.do((_from_replica(db), key), load)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return _cached_page_response(entry, if_none_match, _is_private(db, authorization))
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Expose hit/miss/eviction counters of the book and search caches."""
+    return {"books": await book_cache.snapshot(), "search": await search_cache.snapshot()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus metrics: request latency, SQL usage, event loop lag and cache counters."""
+    cache_lines = []
+    for prefix, cache in (("book_cache", book_cache), ("search_cache", search_cache)):
+        for name, value in (await cache.snapshot()).items():
+            cache_lines.append(f"# TYPE {prefix}_{name} gauge")
+            cache_lines.append(f"{prefix}_{name} {value}")
+    return PlainTextResponse(
+        metrics.render(cache_lines), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 @app.get("/healthcheck")
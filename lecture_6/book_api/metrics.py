@@ -0,0 +1,197 @@
+"""
+Request timing and SQL instrumentation exported in Prometheus text format.
+
+Three sources feed the in-process registry:
+- `MetricsMiddleware` (ASGI) times every request per route template and,
+  when it finishes, records how many SQL statements it ran and how long
+  they took in total. Request time minus SQL time is what was spent in
+  Python: validation, serialization, waiting for the event loop.
+- `record_query()`, called from the engine hooks in `database.py`, adds each
+  statement to the current request's totals (tracked in a ContextVar) and
+  logs statements slower than SLOW_QUERY_MS with their SQL text.
+- `monitor_event_loop()` measures event loop lag: how late a periodic
+  sleep wakes up.
+
+`render()` produces the text served by `GET /metrics`. The registry is per
+process; with several uvicorn workers each one reports its own numbers.
+"""
+
+import asyncio
+import bisect
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Tuple
+
+from config import settings
+
+
+logger = logging.getLogger("book_api.sql")
+
+# Upper bounds (seconds) shared by the latency histograms
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+class Histogram:
+    """Prometheus-style histogram with one series per label tuple."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Iterable[float]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in sorted(self._series.items()):
+            base = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.label_names, labels, le=_number(bound))} {cumulative}"
+            yield f"{self.name}_bucket{_labels(self.label_names, labels, le='+Inf')} {series[-1]}"
+            yield f"{self.name}_sum{base} {_number(series[-2])}"
+            yield f"{self.name}_count{base} {series[-1]}"
+
+
+class Counter:
+    """Monotonic counter with one series per label tuple."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self._series.items()):
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], **extra: str) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Request latency by route.", ("method", "route", "status"), LATENCY_BUCKETS
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_sql_queries", "SQL statements executed per request.", ("route",), QUERY_COUNT_BUCKETS
+)
+REQUEST_SQL_TIME = Histogram(
+    "http_request_sql_duration_seconds", "Total SQL time per request.", ("route",), LATENCY_BUCKETS
+)
+QUERY_DURATION = Histogram(
+    "sql_query_duration_seconds", "Duration of individual SQL statements.", ("operation",), LATENCY_BUCKETS
+)
+SLOW_QUERIES = Counter("sql_slow_queries_total", "Statements slower than SLOW_QUERY_MS.", ("operation",))
+COALESCED_READS = Counter(
+    "singleflight_shared_total", "Reads answered by another request's in-flight load.", ("name",)
+)
+LOOP_LAG = Histogram("event_loop_lag_seconds", "How late periodic event loop wake-ups are.", (), LATENCY_BUCKETS)
+
+_REGISTRY = [REQUEST_DURATION, REQUEST_QUERIES, REQUEST_SQL_TIME, QUERY_DURATION, SLOW_QUERIES, COALESCED_READS, LOOP_LAG]
+
+
+class RequestStats:
+    """SQL totals of the request currently being handled."""
+
+    __slots__ = ("queries", "sql_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def record_query(statement: str, seconds: float) -> None:
+    """Account one executed SQL statement (called from the engine hooks)."""
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+    QUERY_DURATION.observe(seconds, operation)
+    stats = _current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += seconds
+    if seconds * 1000 >= settings.slow_query_ms:
+        SLOW_QUERIES.inc(operation)
+        logger.warning("Slow query (%.1f ms): %s", seconds * 1000, statement)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and SQL usage per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status = ["500"]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_request.reset(token)
+            # The router stores the matched route in the scope; use its template
+            # ("/books/{book_id}") so ids do not explode the label cardinality.
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_DURATION.observe(elapsed, scope["method"], route, status[0])
+            REQUEST_QUERIES.observe(stats.queries, route)
+            REQUEST_SQL_TIME.observe(stats.sql_seconds, route)
+
+
+async def monitor_event_loop(interval: float = 0.5) -> None:
+    """Record event loop lag forever (run as a background task)."""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, time.perf_counter() - started - interval))
+
+
+def render(extra_lines: Iterable[str] = ()) -> str:
+    """Render all metrics (plus `extra_lines`) in Prometheus text format."""
+    lines = [line for metric in _REGISTRY for line in metric.render()]
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
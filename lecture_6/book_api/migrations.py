@@ -0,0 +1,238 @@
+"""
+Versioned schema migrations.
+
+`Base.metadata.create_all` only creates missing tables: it never adds a
+column or an index to a table that already exists, and it reflects the
+whole schema on every start. Instead, the schema version applied to a
+database is recorded in the `schema_version` table (one row per applied
+step), and `migrate()` runs only the steps above it:
+
+- An empty database gets the current schema with `create_all` in one go
+  and is stamped with the latest version.
+- A database created by an older release (no `schema_version` table, or an
+  older version) is upgraded step by step, each step in order.
+- A database that is already current costs a single SELECT.
+
+The upgrade runs in one transaction under a write lock, so when several
+workers start together only the first one applies the steps; the others
+wait, re-read the version and find nothing to do.
+
+Migration 2 never deletes data on its own: when books are duplicated
+(which the unique indexes of migration 3 forbid) it fails with the list of
+duplicate (title, author, year) groups, and nothing is applied. An operator
+then runs `python migrations.py --dedupe`, which keeps the oldest copy of
+every group, or fixes the rows by hand.
+
+Adding a schema change means appending a `Migration` to `MIGRATIONS`
+(never editing an applied one). The steps must also work on databases
+where the table was created by `create_all` at an intermediate version.
+
+Run `python migrations.py` to upgrade (e.g. once before starting the
+workers with DB_MIGRATE_ON_STARTUP=0), `python migrations.py --status`
+to print the current and latest version, or `python migrations.py --dedupe`
+to remove duplicate books and then upgrade.
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Callable, NamedTuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, insert, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import CreateColumn
+
+from database import Base
+import fts
+import models
+
+
+logger = logging.getLogger("book_api.migrations")
+
+_metadata = MetaData()
+
+# Kept out of Base.metadata: it describes the schema, it is not part of it
+schema_version = Table(
+    "schema_version",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable  # called with a sync Connection inside the upgrade transaction
+
+
+def _add_row_version_columns(connection) -> None:
+    existing = {column["name"] for column in inspect(connection).get_columns("books")}
+    for column in (models.Book.__table__.c.version, models.Book.__table__.c.updated_at):
+        if column.name not in existing:
+            ddl = CreateColumn(column).compile(dialect=connection.dialect)
+            connection.exec_driver_sql(f"ALTER TABLE books ADD COLUMN {ddl}")
+
+
+class DuplicateBooksError(RuntimeError):
+    """Raised by migration 2 when books must be deduplicated before the unique indexes."""
+
+
+# Duplicate groups listed in a DuplicateBooksError
+_DUPLICATES_SHOWN = 20
+
+
+def _check_no_duplicate_books(connection) -> None:
+    # GROUP BY puts all NULL years in one group, which matches the
+    # "no year" unique index.
+    groups = connection.execute(text(
+        "SELECT title, author, year, COUNT(*) FROM books "
+        "GROUP BY title, author, year HAVING COUNT(*) > 1 ORDER BY title, author, year"
+    )).all()
+    if not groups:
+        return
+    listed = "\n".join(
+        f"  {title!r} by {author!r} ({year if year is not None else 'no year'}): {count} rows"
+        for title, author, year, count in groups[:_DUPLICATES_SHOWN]
+    )
+    more = f"\n  ... and {len(groups) - _DUPLICATES_SHOWN} more" if len(groups) > _DUPLICATES_SHOWN else ""
+    raise DuplicateBooksError(
+        f"{len(groups)} (title, author, year) group(s) hold duplicate books, which the unique "
+        f"indexes of migration 3 forbid:\n{listed}{more}\n"
+        "Remove them by hand, or run `python migrations.py --dedupe` to keep the oldest row of each."
+    )
+
+
+def remove_duplicate_books(connection) -> int:
+    """Delete all but the oldest copy of every (title, author, year) and return the number deleted."""
+    if not inspect(connection).has_table(models.Book.__tablename__):
+        return 0
+    result = connection.execute(text(
+        "DELETE FROM books WHERE id NOT IN "
+        "(SELECT MIN(id) FROM books GROUP BY title, author, year)"
+    ))
+    if result.rowcount:
+        logger.warning("Removed %d duplicate book row(s)", result.rowcount)
+    return result.rowcount
+
+
+def _create_unique_indexes(connection) -> None:
+    for index in models.Book.__table__.indexes:
+        if index.unique:
+            index.create(connection, checkfirst=True)
+
+
+def _install_fts(connection) -> None:
+    fts.install(connection)
+
+
+# Version 0 is the original schema: `books` with id, title, author, year
+MIGRATIONS = (
+    Migration(1, "add books.version and books.updated_at", _add_row_version_columns),
+    Migration(2, "check for duplicate books", _check_no_duplicate_books),
+    Migration(3, "unique indexes on (title, author, year)", _create_unique_indexes),
+    Migration(4, "full-text index books_fts", _install_fts),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(connection) -> int:
+    """Return the applied schema version (0 when nothing was recorded)."""
+    if not inspect(connection).has_table(schema_version.name):
+        return 0
+    return connection.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def _create_version_table(connection) -> None:
+    # Two workers starting on a fresh database can both see no table and both
+    # run CREATE TABLE; the loser fails once the winner commits. The savepoint
+    # keeps that failure from aborting the upgrade transaction (PostgreSQL).
+    try:
+        with connection.begin_nested():
+            schema_version.create(connection, checkfirst=True)
+    except DBAPIError:
+        if not inspect(connection).has_table(schema_version.name):
+            raise
+
+
+def _lock(connection) -> None:
+    # Serialize concurrent upgrades: PostgreSQL has table locks; on SQLite
+    # any write statement takes the database's single write lock.
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"LOCK TABLE {schema_version.name} IN EXCLUSIVE MODE")
+    else:
+        connection.execute(schema_version.update().where(text("1 = 0")).values(version=0))
+
+
+def _record(connection, migration: Migration) -> None:
+    connection.execute(insert(schema_version).values(
+        version=migration.version, description=migration.description, applied_at=datetime.now(timezone.utc),
+    ))
+
+
+def upgrade(connection) -> int:
+    """Apply pending migrations on a sync connection and return the new version."""
+    _create_version_table(connection)
+    _lock(connection)
+    version = current_version(connection)
+    if version >= LATEST_VERSION:
+        return version
+
+    if version == 0 and not inspect(connection).has_table(models.Book.__tablename__):
+        # Empty database: create the current schema directly
+        Base.metadata.create_all(connection)
+        _record(connection, MIGRATIONS[-1]._replace(description="initial schema"))
+        return LATEST_VERSION
+
+    for migration in MIGRATIONS:
+        if migration.version > version:
+            migration.apply(connection)
+            _record(connection, migration)
+    return LATEST_VERSION
+
+
+async def migrate(engine: AsyncEngine) -> int:
+    """Bring the database behind `engine` up to LATEST_VERSION.
+
+    Only reads the version when the schema is already current.
+    """
+    async with engine.connect() as conn:
+        version = await conn.run_sync(current_version)
+    if version >= LATEST_VERSION:
+        return version
+    async with engine.begin() as conn:
+        return await conn.run_sync(upgrade)
+
+
+async def _main(status: bool, dedupe: bool) -> None:
+    from database import engine
+
+    try:
+        if status:
+            async with engine.connect() as conn:
+                version = await conn.run_sync(current_version)
+            print(f"Schema version {version} (latest {LATEST_VERSION})")
+            return
+        if dedupe:
+            # remove_duplicate_books logs how many rows it deleted
+            async with engine.begin() as conn:
+                await conn.run_sync(remove_duplicate_books)
+        print(f"Schema at version {await migrate(engine)}")
+    except DuplicateBooksError as e:
+        raise SystemExit(str(e))
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations to DATABASE_URL.")
+    parser.add_argument("--status", action="store_true", help="only print the current schema version")
+    parser.add_argument(
+        "--dedupe", action="store_true", help="delete duplicate books (keeping the oldest of each) before upgrading"
+    )
+    args = parser.parse_args()
+    asyncio.run(_main(args.status, args.dedupe))
@@ -8,16 +8,31 @@ Fields:
 - title: required string
 - author: required string
 - year: optional integer
+- version: row version, starts at 1 and is bumped by every update
+- updated_at: UTC time of the last write (NULL for rows created before
+  the column existed)
 
 
-All fields have basic indexing where helpful.
+All fields have basic indexing where helpful. A book is identified by
+(title, author, year): two partial unique indexes enforce that in the
+database itself, one for rows with a year and one for rows without
+(a plain unique index would treat every NULL year as distinct).
+
+`version` and `updated_at` back the ETag / Last-Modified headers and the
+optimistic concurrency check of `If-Match` on PUT.
 """
 
 
-from sqlalchemy import Column, Integer, String
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, text
 from database import Base
 
 
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
 class Book(Base):
     """SQLAlchemy ORM model representing a book record."""
 
@@ -32,3 +47,21 @@ class Book(Base):
 
     # Optional publication year
     year = Column(Integer, nullable=True, index=True)
+
+    # Row version for ETags and optimistic concurrency; crud.update_book
+    # increments it in the same UPDATE statement that changes the row.
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"))
+
+    # Time of the last write, used for Last-Modified
+    updated_at = Column(DateTime(timezone=True), nullable=True, default=_utcnow, onupdate=_utcnow)
+
+    __table_args__ = (
+        Index(
+            "uq_books_title_author_year", "title", "author", "year", unique=True,
+            sqlite_where=text("year IS NOT NULL"), postgresql_where=text("year IS NOT NULL"),
+        ),
+        Index(
+            "uq_books_title_author_no_year", "title", "author", unique=True,
+            sqlite_where=text("year IS NULL"), postgresql_where=text("year IS NULL"),
+        ),
+    )
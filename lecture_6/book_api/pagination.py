@@ -0,0 +1,91 @@
+"""
+Opaque cursor tokens for keyset (seek) pagination.
+
+Offset pagination (`skip`/`limit`) forces the database to walk and discard
+`skip` rows for every page. Keyset pagination instead remembers the sort
+key and the `id` of the last row that was returned and asks for rows
+strictly after it, which is an index range scan no matter how deep the page.
+
+The token handed to clients is URL-safe base64 of a small JSON document,
+so clients must treat it as opaque and just echo it back in `after`.
+"""
+
+import base64
+import binascii
+import json
+from typing import Any, Literal, Optional, Sequence, Tuple
+
+
+# Columns a client may sort by in cursor mode. Each one is backed by an
+# index whose entries also carry the rowid (`id`), so (key, id) seeks are cheap.
+SortKey = Literal["id", "title", "author"]
+
+# Orderings of search results; all but "relevance" (bm25 scores are not a
+# stable key) also support cursors.
+SearchSortKey = Literal["relevance", "id", "title", "year"]
+
+# Response header carrying the number of matches over all pages (on request)
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+# Response header carrying the cursor of the next page.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# Range of SQL (64-bit) integers: larger ids or years cannot even be bound
+_INT64_MIN, _INT64_MAX = -2**63, 2**63 - 1
+
+# Type of the sort value stored in cursors of each ordering; None stands for
+# a NULL year, which sorts last.
+_VALUE_TYPES = {"title": (str,), "author": (str,), "year": (int, type(None))}
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded or was issued for another ordering."""
+
+
+def encode_cursor(sort: str, value: Any, book_id: int) -> str:
+    """Build an opaque cursor pointing just past the row (value, book_id)."""
+    payload = {"s": sort, "id": book_id}
+    if sort != "id":
+        payload["v"] = value
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(token: str, sort: str) -> Tuple[Any, int]:
+    """Return the (sort value, id) pair stored in `token`.
+
+    Raises InvalidCursor when the token is malformed or was issued for a
+    different sort key than the one requested.
+    """
+    padded = token + "=" * (-len(token) % 4)
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        token_sort = payload["s"]
+        book_id = payload["id"]
+        value = payload.get("v", book_id)
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+
+    if token_sort != sort:
+        raise InvalidCursor(f"Cursor was issued for sort={token_sort!r}, not sort={sort!r}")
+    # bool is an int subclass; nothing but the expected scalar may reach SQL
+    if isinstance(book_id, bool) or not isinstance(book_id, int) or not _INT64_MIN <= book_id <= _INT64_MAX:
+        raise InvalidCursor("Malformed cursor")
+    if sort != "id":
+        if isinstance(value, bool) or not isinstance(value, _VALUE_TYPES.get(sort, ())):
+            raise InvalidCursor("Malformed cursor")
+        if isinstance(value, int) and not _INT64_MIN <= value <= _INT64_MAX:
+            raise InvalidCursor("Malformed cursor")
+    return value, book_id
+
+
+def next_cursor(rows: Sequence[Any], sort: str, limit: int) -> Optional[str]:
+    """Return the cursor for the page after `rows`, or None on the last page.
+
+    A short page means the table has been exhausted, so no cursor is issued.
+    """
+    if limit <= 0 or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(sort, getattr(last, sort), last.id)
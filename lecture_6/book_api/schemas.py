@@ -7,8 +7,8 @@ which fields are required for each operation and keeps API contracts explicit.
 """
 
 
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Optional
 
 
 class BookBase(BaseModel):
@@ -32,8 +32,27 @@ class BookUpdate(BaseModel):
 
 class BookOut(BookBase):
     """Schema used for responses. Includes the auto-generated `id` field."""
+    model_config = ConfigDict(from_attributes=True)  # allow building from ORM objects
+
     id: int
 
 
-class Config:
-    orm_mode = True  # allow returning ORM objects directly
+class BulkCreateResult(BaseModel):
+    """Summary returned by the bulk create endpoint."""
+    created: int
+    skipped: int
+
+
+# Most ids a single batch request may ask for
+BATCH_MAX_IDS = 1000
+
+
+class BookBatchRequest(BaseModel):
+    """Body of `POST /books/batch`: the ids to fetch, in the order wanted back."""
+    ids: List[int] = Field(min_length=1, max_length=BATCH_MAX_IDS)
+
+
+class BookBatch(BaseModel):
+    """Books found for a batch request, in request order, plus the ids that do not exist."""
+    books: List[BookOut]
+    missing: List[int]
@@ -1,7 +1,41 @@
-from database import SessionLocal
+"""
+Bulk seeder for the books table.
+
+Loads books from the built-in list, from CSV/NDJSON files and/or from a
+synthetic generator, and writes them through `AsyncSessionLocal` with
+batched `INSERT ... ON CONFLICT DO NOTHING` statements (`crud.insert_books`)
+inside a single transaction. Books that already exist are skipped, so the
+seeder is idempotent: running it twice does not create duplicates.
+
+Examples:
+    python seed.py                                  # built-in list
+    python seed.py --file catalogue.csv --file more.ndjson
+    python seed.py --synthetic 5000000 --batch-size 5000
+    python seed.py --reset                          # empty the table first
+
+CSV files need a header with `title`, `author` and (optional) `year`
+columns; NDJSON files hold one `{"title", "author", "year"}` object per line.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import delete
+
+from database import AsyncSessionLocal, engine
 from models import Book
+import crud
+import migrations
+import schemas
 
-# Набор книг для заполнения
+# Built-in set of books
 books_data = [
     {"title": "1984", "author": "George Orwell", "year": 1949},
     {"title": "Animal Farm", "author": "George Orwell", "year": 1945},
@@ -25,22 +59,166 @@ books_data = [
     {"title": "The Little Prince", "author": "Antoine de Saint-Exupéry", "year": 1943},
 ]
 
-def seed():
-    db = SessionLocal()
+SYNTHETIC_WORDS = (
+    "shadow river garden empire winter silent golden broken hidden last night city stone "
+    "dream house ocean wolf crown storm glass fire secret journey forest iron star letter"
+).split()
+SYNTHETIC_AUTHORS = [book["author"] for book in books_data]
+
+
+class SeedStats:
+    """Counters reported at the end of a run."""
+
+    def __init__(self):
+        self.read = 0
+        self.created = 0
+        self.invalid = 0
+
+    @property
+    def skipped(self) -> int:
+        return self.read - self.invalid - self.created
+
+
+def read_csv(path: str) -> Iterator[Dict]:
+    """Stream rows of a CSV file with title/author/year columns."""
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield {"title": row.get("title"), "author": row.get("author"), "year": row.get("year") or None}
+
+
+def read_ndjson(path: str) -> Iterator[Optional[Dict]]:
+    """Stream objects of an NDJSON file (one JSON object per line).
+
+    A line that is not valid JSON yields None, so `validated` counts it as
+    invalid instead of the whole seed being aborted.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+def synthetic_books(count: int, seed: int = 0) -> Iterator[Dict]:
+    """Generate `count` unique, reproducible synthetic books for benchmarking."""
+    rng = random.Random(seed)
+    for index in range(count):
+        title = " ".join(rng.choice(SYNTHETIC_WORDS) for _ in range(3)).title()
+        yield {"title": f"{title} {index}", "author": rng.choice(SYNTHETIC_AUTHORS), "year": rng.randint(1800, 2025)}
+
+
+def read_file(path: str) -> Iterator[Dict]:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return read_csv(path)
+    if extension in (".ndjson", ".jsonl"):
+        return read_ndjson(path)
+    raise ValueError(f"Unsupported file type {extension!r}: use .csv, .ndjson or .jsonl")
+
+
+def validated(rows: Iterable[Optional[Dict]], stats: SeedStats, trusted: bool = False) -> Iterator[Dict]:
+    """Validate rows with BookCreate, counting and reporting invalid ones.
+
+    `trusted` rows (synthetic data) skip validation to keep generation fast.
+    """
+    for number, row in enumerate(rows, start=1):
+        stats.read += 1
+        if trusted:
+            yield row
+            continue
+        if row is None:
+            stats.invalid += 1
+            print(f"Skipping invalid row {number}: not valid JSON")
+            continue
+        try:
+            book = schemas.BookCreate.model_validate(row)
+        except ValidationError as e:
+            stats.invalid += 1
+            print(f"Skipping invalid row {number}: {e.errors(include_url=False)[0]['msg']}")
+            continue
+        yield {"title": book.title, "author": book.author, "year": book.year}
+
+
+def batched(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch: List[Dict] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def seed(
+    files: Iterable[str] = (),
+    synthetic: int = 0,
+    builtin: bool = True,
+    reset: bool = False,
+    batch_size: int = 5000,
+    random_seed: int = 0,
+) -> SeedStats:
+    """Load all requested sources in one transaction and return the counters."""
+    await migrations.migrate(engine)
+    stats = SeedStats()
+    sources = []
+    if builtin:
+        sources.append(validated(books_data, stats))
+    for path in files:
+        sources.append(validated(read_file(path), stats))
+    if synthetic:
+        sources.append(validated(synthetic_books(synthetic, random_seed), stats, trusted=True))
+
+    async with AsyncSessionLocal() as db:
+        if reset:
+            await db.execute(delete(Book))
+        for source in sources:
+            for batch in batched(source, batch_size):
+                stats.created += await crud.insert_books(db, batch)
+        # Everything is committed at once: a failure leaves the table untouched
+        await db.commit()
+    return stats
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", action="append", default=[], help="CSV or NDJSON file to load (repeatable)")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="N", help="generate N synthetic books")
+    parser.add_argument("--builtin", action="store_true", help="also load the built-in list with other sources")
+    parser.add_argument("--reset", action="store_true", help="delete all books before loading")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per INSERT batch")
+    parser.add_argument("--random-seed", type=int, default=0, help="seed of the synthetic generator")
+    return parser
+
 
-    # Очистить таблицу (если хочешь начинать с нуля)
-    db.query(Book).delete()
-    db.commit()
+async def _run(args) -> None:
+    started = time.perf_counter()
+    try:
+        stats = await seed(
+            files=args.file,
+            synthetic=args.synthetic,
+            # Without other sources the built-in list is loaded, as before
+            builtin=args.builtin or not (args.file or args.synthetic),
+            reset=args.reset,
+            batch_size=args.batch_size,
+            random_seed=args.random_seed,
+        )
+    finally:
+        await engine.dispose()
+    elapsed = time.perf_counter() - started
+    rate = stats.read / elapsed if elapsed else 0.0
+    print(
+        f"Read {stats.read} rows: {stats.created} created, {stats.skipped} already present, "
+        f"{stats.invalid} invalid in {elapsed:.2f}s ({rate:,.0f} rows/s)"
+    )
 
-    # Добавить книги
-    for data in books_data:
-        book = Book(**data)
-        db.add(book)
 
-    db.commit()
-    db.close()
-    print("База заполнена успешно!")
+def main(argv: Optional[List[str]] = None) -> None:
+    asyncio.run(_run(build_parser().parse_args(argv)))
 
 
 if __name__ == "__main__":
-    seed()
+    main()
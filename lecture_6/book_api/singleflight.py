@@ -0,0 +1,67 @@
+"""
+Request coalescing ("single flight") for identical concurrent reads.
+
+When a popular book drops out of the cache, hundreds of concurrent
+`GET /books/{book_id}` requests would each run the same query. A
+`SingleFlight` group lets the first caller for a key (the leader) run the
+load while every caller arriving before it finishes awaits the same result,
+so the database sees one query instead of N.
+
+Only calls that overlap in time are merged; nothing is kept once the
+leader returns (caching is the caches' job). The load runs in the leader's
+own task, with its session. If the leader is cancelled (e.g. the client
+disconnected), waiting callers are not failed with it: one of them retries
+and becomes the new leader. Exceptions raised by the load are re-raised in
+every waiting caller, so loads should report "not found" as a value.
+
+Groups are per process and per event loop, like the caches.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+import metrics
+
+
+T = TypeVar("T")
+
+# Result handed to waiting callers when the leader was cancelled
+_RETRY = object()
+
+
+class SingleFlight:
+    """Group of in-flight loads keyed by what they read."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, load: Callable[[], Awaitable[T]]) -> T:
+        """Return `await load()`, sharing one call among concurrent callers with the same key."""
+        while True:
+            flight = self._flights.get(key)
+            if flight is None:
+                break
+            metrics.COALESCED_READS.inc(self.name)
+            # shield: a waiting caller being cancelled must not cancel the flight
+            result = await asyncio.shield(flight)
+            if result is not _RETRY:
+                return result
+
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        try:
+            result = await load()
+        except asyncio.CancelledError:
+            flight.set_result(_RETRY)
+            raise
+        except BaseException as e:
+            flight.set_exception(e)
+            # Mark it retrieved so a flight nobody waited on does not log a warning
+            flight.exception()
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            del self._flights[key]
@@ -1,16 +1,26 @@
+import csv
+import io
+import json
 import pytest
 import anyio
 from httpx import AsyncClient
 from httpx import ASGITransport
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from database import Base
-from main import app, get_db
+from sqlalchemy import event, text
+from database import Base, ReplicaRouter, instrument, make_engine
+from main import READ_YOUR_WRITES_COOKIE, app, book_cache, get_db, search_cache
+from cache import LRUCache
+from compression import negotiate
+import migrations
+from singleflight import SingleFlight
+from pagination import encode_cursor
 
 # ---------------------------
 # Test DB setup (in-memory)
 # ---------------------------
 SQLALCHEMY_TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 engine_test = create_async_engine(SQLALCHEMY_TEST_DATABASE_URL, future=True, echo=False)
+instrument(engine_test.sync_engine)
 TestingSessionLocal = async_sessionmaker(bind=engine_test, expire_on_commit=False, class_=AsyncSession)
 
 
@@ -101,3 +111,717 @@ async def test_search_books(client):
     await client.post("/books/", json={"title": "Another One", "year": 2021})
     resp_title = await client.get("/books/search/?title=Search")
     assert any(b["title"] == "Search Me" for b in resp_title.json())
+
+
+@pytest.mark.anyio
+async def test_read_books_cursor_pagination(client):
+    for i in range(5):
+        await client.post("/books/", json={"title": f"Cursor Book {i}", "author": "Pager", "year": 2000 + i})
+    all_ids = [b["id"] for b in (await client.get("/books/?limit=1000")).json()]
+
+    seen = []
+    resp = await client.get("/books/?limit=2")
+    while True:
+        assert resp.status_code == 200
+        seen.extend(b["id"] for b in resp.json())
+        cursor = resp.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        resp = await client.get("/books/", params={"limit": 2, "after": cursor})
+    assert seen == all_ids
+
+
+@pytest.mark.anyio
+async def test_read_books_cursor_sorted_by_title(client):
+    first = await client.get("/books/?limit=3&sort=title")
+    second = await client.get("/books/", params={"limit": 3, "sort": "title", "after": first.headers["X-Next-Cursor"]})
+    titles = [b["title"] for b in first.json() + second.json()]
+    assert titles == sorted(titles)
+
+
+@pytest.mark.anyio
+async def test_read_books_invalid_cursor(client):
+    assert (await client.get("/books/?after=not-a-cursor")).status_code == 400
+    id_cursor = (await client.get("/books/?limit=1")).headers["X-Next-Cursor"]
+    assert (await client.get("/books/", params={"after": id_cursor, "sort": "title"})).status_code == 400
+    # Well-formed JSON with values of the wrong type is rejected too
+    for payload in ({"s": "title", "id": 1, "v": ["a"]}, {"s": "title", "id": 1, "v": {"a": 1}},
+                    {"s": "title", "id": True, "v": "a"}, {"s": "id", "id": "1"},
+                    {"s": "id", "id": 10**25}, {"s": "title", "id": -2**63 - 1, "v": "a"}):
+        forged = encode_cursor(payload["s"], payload.get("v"), payload["id"])
+        assert (await client.get("/books/", params={"after": forged, "sort": payload["s"]})).status_code == 400
+    for year in ([2000], 10**25, -2**63 - 1):
+        year_cursor = encode_cursor("year", year, 1)
+        response = await client.get("/books/search/", params={"author": "x", "sort": "year", "after": year_cursor})
+        assert response.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_search_books_full_text(client):
+    await client.post("/books/", json={"title": "Gardening For Everyone", "author": "Maple Greenleaf", "year": 2010})
+    await client.post("/books/", json={"title": "Everyone Gardens", "author": "Oak Barkley", "year": 2011})
+
+    # Prefix, case-insensitive and token-order independent matching
+    resp = await client.get("/books/search/?title=garden everyone")
+    titles = {b["title"] for b in resp.json()}
+    assert titles == {"Gardening For Everyone", "Everyone Gardens"}
+
+    resp = await client.get("/books/search/?title=garden&author=green")
+    assert [b["title"] for b in resp.json()] == ["Gardening For Everyone"]
+
+    resp = await client.get("/books/search/?title=garden&year=2011")
+    assert [b["title"] for b in resp.json()] == ["Everyone Gardens"]
+
+
+@pytest.mark.anyio
+async def test_search_index_follows_writes(client):
+    create_resp = await client.post("/books/", json={"title": "Quixotic Drafts", "author": "Ink", "year": 2001})
+    book_id = create_resp.json()["id"]
+    await client.put(f"/books/{book_id}", json={"title": "Zephyr Notes"})
+
+    assert (await client.get("/books/search/?title=quixotic")).json() == []
+    assert [b["id"] for b in (await client.get("/books/search/?title=zephyr")).json()] == [book_id]
+
+    await client.delete(f"/books/{book_id}")
+    assert (await client.get("/books/search/?title=zephyr")).json() == []
+
+
+@pytest.mark.anyio
+async def test_bulk_create_json_array(client):
+    await client.post("/books/", json={"title": "Bulk Existing", "author": "Batcher", "year": 1990})
+    payload = [
+        {"title": "Bulk Existing", "author": "Batcher", "year": 1990},
+        {"title": "Bulk One", "author": "Batcher", "year": 1991},
+        {"title": "Bulk Two", "author": "Batcher"},
+        {"title": "Bulk Two", "author": "Batcher"},
+        {"title": "Bulk Three", "author": "Batcher", "year": 1993},
+    ]
+    response = await client.post("/books/bulk?chunk_size=2", json=payload)
+    assert response.status_code == 200
+    assert response.json() == {"created": 3, "skipped": 2}
+
+    response = await client.post("/books/bulk", json=payload)
+    assert response.json() == {"created": 0, "skipped": 5}
+
+
+@pytest.mark.anyio
+async def test_bulk_create_ndjson(client):
+    body = (
+        '{"title": "Stream A", "author": "Liner", "year": 2001}\n'
+        "\n"
+        '{"title": "Stream B", "author": "Liner", "year": 2002}\n'
+        '{"title": "Stream A", "author": "Liner", "year": 2001}'
+    )
+    response = await client.post(
+        "/books/bulk", content=body, headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.json() == {"created": 2, "skipped": 1}
+
+    response = await client.post(
+        "/books/bulk", content='{"title": "Stream C", "author": "Liner"}\n{"author": "No Title"}\n',
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"]["item"] == 2
+
+    # A line that is not JSON at all is a 422 too (the raw line is not echoed back)
+    response = await client.post(
+        "/books/bulk", content='{"title": "Q", "author": "z"}\n{bad json\n',
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert detail["item"] == 2
+    assert detail["errors"][0]["type"] == "json_invalid"
+    assert "input" not in detail["errors"][0]
+
+
+@pytest.mark.anyio
+async def test_create_duplicate_book_conflict(client):
+    book = {"title": "Only Once", "author": "Unique", "year": 2015}
+    assert (await client.post("/books/", json=book)).status_code == 201
+    assert (await client.post("/books/", json=book)).status_code == 409
+
+    # A missing year counts as a value of its own for uniqueness
+    no_year = {"title": "Only Once", "author": "Unique"}
+    assert (await client.post("/books/", json=no_year)).status_code == 201
+    assert (await client.post("/books/", json=no_year)).status_code == 409
+
+
+@pytest.mark.anyio
+async def test_read_book_by_id_is_cached_and_invalidated(client):
+    create_resp = await client.post("/books/", json={"title": "Cached Book", "author": "Hot", "year": 2020})
+    book_id = create_resp.json()["id"]
+
+    before = (await client.get("/cache/stats")).json()["books"]
+    await client.get(f"/books/{book_id}")
+    response = await client.get(f"/books/{book_id}")
+    after = (await client.get("/cache/stats")).json()["books"]
+    assert response.json()["title"] == "Cached Book"
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"] + 1
+
+    await client.put(f"/books/{book_id}", json={"title": "Cached Book 2"})
+    assert (await client.get(f"/books/{book_id}")).json()["title"] == "Cached Book 2"
+
+
+@pytest.mark.anyio
+async def test_lru_cache_eviction():
+    lru = LRUCache(maxsize=2, ttl=60)
+    await lru.set(1, b"one")
+    await lru.set(2, b"two")
+    assert await lru.get(1) == b"one"  # 1 becomes most recently used
+    await lru.set(3, b"three")  # evicts 2
+    assert await lru.get(2) is None
+    assert await lru.get(1) == b"one"
+    assert (await lru.snapshot())["evictions"] == 1
+
+
+@pytest.mark.anyio
+async def test_sqlite_engine_pragmas(tmp_path):
+    file_engine = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'pragmas.db'}")
+    async with file_engine.connect() as conn:
+        assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+        assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 5000
+        assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1  # NORMAL
+    await file_engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_export_books_streams_all_rows(client):
+    expected = (await client.get("/books/?limit=100000")).json()
+
+    response = await client.get("/books/export?format=ndjson&batch_size=3")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows == expected
+
+    response = await client.get("/books/export?format=csv&batch_size=3")
+    assert response.headers["content-type"].startswith("text/csv")
+    reader = csv.DictReader(io.StringIO(response.text))
+    assert [int(r["id"]) for r in reader] == [b["id"] for b in expected]
+
+
+@pytest.mark.anyio
+async def test_list_endpoints_keep_openapi_schema(client):
+    schema = (await client.get("/openapi.json")).json()
+    for path in ("/books/", "/books/search/"):
+        content = schema["paths"][path]["get"]["responses"]["200"]["content"]["application/json"]
+        assert content["schema"]["items"]["$ref"] == "#/components/schemas/BookOut"
+
+    book = (await client.get("/books/?limit=1")).json()[0]
+    assert list(book) == ["title", "author", "year", "id"]
+
+
+@pytest.mark.anyio
+async def test_conditional_get_book(client):
+    book_id = (await client.post("/books/", json={"title": "Tagged", "author": "Etag", "year": 2001})).json()["id"]
+    first = await client.get(f"/books/{book_id}")
+    etag = first.headers["ETag"]
+    assert "Last-Modified" in first.headers
+
+    not_modified = await client.get(f"/books/{book_id}", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    await client.put(f"/books/{book_id}", json={"year": 2002})
+    changed = await client.get(f"/books/{book_id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+@pytest.mark.anyio
+async def test_conditional_get_books_page(client):
+    first = await client.get("/books/?limit=5")
+    etag = first.headers["ETag"]
+    assert (await client.get("/books/?limit=5", headers={"If-None-Match": etag})).status_code == 304
+
+    book_id = first.json()[0]["id"]
+    await client.put(f"/books/{book_id}", json={"author": "Someone Else"})
+    assert (await client.get("/books/?limit=5", headers={"If-None-Match": etag})).status_code == 200
+
+
+@pytest.mark.anyio
+async def test_update_book_if_match(client):
+    book_id = (await client.post("/books/", json={"title": "Guarded", "author": "Lock", "year": 1999})).json()["id"]
+    etag = (await client.get(f"/books/{book_id}")).headers["ETag"]
+
+    ok = await client.put(f"/books/{book_id}", json={"title": "Guarded v2"}, headers={"If-Match": etag})
+    assert ok.status_code == 200
+    assert ok.headers["ETag"] != etag
+
+    # The old ETag is stale now
+    stale = await client.put(f"/books/{book_id}", json={"title": "Guarded v3"}, headers={"If-Match": etag})
+    assert stale.status_code == 412
+    assert (await client.get(f"/books/{book_id}")).json()["title"] == "Guarded v2"
+
+    # A list matches if any strong tag is the current version; weak tags never do
+    current = ok.headers["ETag"]
+    weak = await client.put(f"/books/{book_id}", json={"year": 2000}, headers={"If-Match": f"W/{current}"})
+    assert weak.status_code == 412
+    listed = await client.put(f"/books/{book_id}", json={"title": "Guarded v3"}, headers={"If-Match": f"{etag}, {current}"})
+    assert listed.status_code == 200
+    stale_list = f'{etag}, W/{listed.headers["ETag"]}'
+    assert (await client.put(f"/books/{book_id}", json={"year": 2001}, headers={"If-Match": stale_list})).status_code == 412
+    assert (await client.get(f"/books/{book_id}")).json()["title"] == "Guarded v3"
+
+    # The whole tag must match, not only the version number before the dot
+    forged = '"{}.123"'.format(listed.headers["ETag"].strip('"').split(".")[0])
+    assert (await client.put(f"/books/{book_id}", json={"year": 2002}, headers={"If-Match": forged})).status_code == 412
+    assert (await client.put(f"/books/{book_id}", json={}, headers={"If-Match": forged})).status_code == 412
+    current = listed.headers["ETag"]
+    assert (await client.put(f"/books/{book_id}", json={}, headers={"If-Match": current})).status_code == 200
+
+    # An ETag of a deleted book does not match a new book that reuses its id
+    assert (await client.delete(f"/books/{book_id}")).status_code == 200
+    reborn = (await client.post("/books/", json={"title": "Reborn", "author": "Lock", "year": 1999})).json()["id"]
+    assert reborn == book_id  # SQLite reuses the largest rowid
+    assert (await client.put(f"/books/{book_id}", json={"year": 2003}, headers={"If-Match": current})).status_code == 412
+    await client.delete(f"/books/{reborn}")
+
+    # If-Match on a missing book fails the precondition (even `*`)
+    assert (await client.put("/books/999999", json={"year": 1}, headers={"If-Match": "*"})).status_code == 412
+    assert (await client.put("/books/999999", json={"year": 1}, headers={"If-Match": current})).status_code == 412
+    assert (await client.put("/books/999999", json={"year": 1})).status_code == 404
+
+
+@pytest.mark.anyio
+async def test_update_and_delete_use_one_statement(client):
+    book_id = (await client.post("/books/", json={"title": "One Shot", "author": "Single", "year": 2005})).json()["id"]
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0].upper())
+
+    event.listen(engine_test.sync_engine, "before_cursor_execute", record)
+    try:
+        assert (await client.put(f"/books/{book_id}", json={"year": 2006})).json()["year"] == 2006
+        assert statements == ["UPDATE"]
+        statements.clear()
+        assert (await client.delete(f"/books/{book_id}")).status_code == 200
+        assert statements == ["DELETE"]
+    finally:
+        event.remove(engine_test.sync_engine, "before_cursor_execute", record)
+
+    assert (await client.put(f"/books/{book_id}", json={"year": 2007})).status_code == 404
+    assert (await client.delete(f"/books/{book_id}")).status_code == 404
+
+
+@pytest.mark.anyio
+async def test_update_book_to_duplicate_conflict(client):
+    await client.post("/books/", json={"title": "Taken", "author": "First", "year": 2000})
+    book_id = (await client.post("/books/", json={"title": "Free", "author": "First", "year": 2000})).json()["id"]
+    response = await client.put(f"/books/{book_id}", json={"title": "Taken"})
+    assert response.status_code == 409
+
+
+@pytest.mark.anyio
+async def test_metrics_endpoint(client):
+    book_id = (await client.post("/books/", json={"title": "Measured", "author": "Meter", "year": 2003})).json()["id"]
+    await client.put(f"/books/{book_id}", json={"year": 2004})
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text_body = response.text
+    assert 'http_request_duration_seconds_count{method="PUT",route="/books/{book_id}",status="200"}' in text_body
+    assert 'http_request_sql_queries_count{route="/books/{book_id}"}' in text_body
+    assert 'sql_query_duration_seconds_count{operation="UPDATE"}' in text_body
+    assert "book_cache_hits" in text_body
+
+
+@pytest.mark.anyio
+async def test_migrations_upgrade_existing_database(tmp_path, caplog):
+    file_engine = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+    try:
+        # Schema and data as created by the original release, with duplicates
+        async with file_engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TABLE books (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL, "
+                "author VARCHAR NOT NULL, year INTEGER)"
+            ))
+            await conn.execute(text(
+                "INSERT INTO books (title, author, year) VALUES "
+                "('Old', 'Writer', 1990), ('Old', 'Writer', 1990), ('Undated', 'Writer', NULL), "
+                "('Undated', 'Writer', NULL), ('Other', 'Writer', 1991)"
+            ))
+
+        # Duplicates are never deleted implicitly: the upgrade stops and lists them
+        with pytest.raises(migrations.DuplicateBooksError) as error:
+            await migrations.migrate(file_engine)
+        assert "'Old' by 'Writer' (1990): 2 rows" in str(error.value)
+        assert "'Undated' by 'Writer' (no year): 2 rows" in str(error.value)
+        async with file_engine.connect() as conn:
+            assert await conn.run_sync(migrations.current_version) == 0
+            assert (await conn.execute(text("SELECT COUNT(*) FROM books"))).scalar() == 5
+
+        # The operator's explicit --dedupe step
+        async with file_engine.begin() as conn:
+            assert await conn.run_sync(migrations.remove_duplicate_books) == 2
+        assert "Removed 2 duplicate book row(s)" in caplog.text
+
+        assert await migrations.migrate(file_engine) == migrations.LATEST_VERSION
+        async with file_engine.connect() as conn:
+            rows = (await conn.execute(text("SELECT id, title, version FROM books ORDER BY id"))).all()
+            assert [(row.id, row.title, row.version) for row in rows] == [(1, "Old", 1), (3, "Undated", 1), (5, "Other", 1)]
+            versions = (await conn.execute(text("SELECT version FROM schema_version ORDER BY version"))).scalars().all()
+            assert versions == [m.version for m in migrations.MIGRATIONS]
+            with pytest.raises(Exception):
+                await conn.execute(text("INSERT INTO books (title, author) VALUES ('Undated', 'Writer')"))
+
+        # Already current: nothing is applied again
+        assert await migrations.migrate(file_engine) == migrations.LATEST_VERSION
+        async with file_engine.connect() as conn:
+            count = (await conn.execute(text("SELECT COUNT(*) FROM schema_version"))).scalar()
+            assert count == len(migrations.MIGRATIONS)
+    finally:
+        await file_engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_migrations_tolerate_concurrent_version_table_creation(tmp_path, monkeypatch):
+    file_engine = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'race.db'}")
+    try:
+        # Another worker created schema_version after this one checked for it
+        async with file_engine.begin() as conn:
+            await conn.run_sync(migrations.schema_version.create)
+        create = migrations.schema_version.create
+        monkeypatch.setattr(
+            migrations.schema_version, "create", lambda connection, checkfirst=True: create(connection, checkfirst=False)
+        )
+        assert await migrations.migrate(file_engine) == migrations.LATEST_VERSION
+    finally:
+        await file_engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_migrations_create_empty_database(tmp_path):
+    file_engine = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'new.db'}")
+    try:
+        assert await migrations.migrate(file_engine) == migrations.LATEST_VERSION
+        async with file_engine.connect() as conn:
+            assert await conn.run_sync(migrations.current_version) == migrations.LATEST_VERSION
+            columns = (await conn.execute(text("SELECT name FROM pragma_table_info('books')"))).scalars().all()
+            assert {"version", "updated_at"} <= set(columns)
+    finally:
+        await file_engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_list_compression_and_cache_control(client):
+    books = [{"title": f"Compressed {i}", "author": "Squeezer", "year": 1900 + i} for i in range(50)]
+    await client.post("/books/bulk", json=books)
+
+    response = await client.get("/books/?limit=1000", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert response.headers["etag"].startswith("W/")
+    assert response.headers["cache-control"].startswith("public, max-age=")
+    assert any(book["title"] == "Compressed 0" for book in response.json())
+
+    plain = await client.get("/books/?limit=1000", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.content == response.content
+
+    private = await client.get("/books/search/?author=Squeezer", headers={"Authorization": "Bearer x"})
+    assert private.headers["cache-control"] == "private, no-cache"
+
+    small = await client.get("/healthcheck", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+    export = await client.get("/books/export", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in export.headers
+
+
+def test_negotiate_encoding():
+    assert negotiate("gzip, br", ("zstd", "br", "gzip")) == "br"
+    assert negotiate("gzip;q=1.0, br;q=0.5", ("zstd", "br", "gzip")) == "gzip"
+    assert negotiate("*", ("zstd", "gzip")) == "zstd"
+    assert negotiate("gzip;q=0, identity", ("gzip",)) is None
+    assert negotiate("", ("gzip",)) is None
+
+
+@pytest.mark.anyio
+async def test_search_cache_invalidated_by_writes(client):
+    book_id = (await client.post("/books/", json={"title": "Cached Search", "author": "Genny", "year": 1999})).json()["id"]
+    first = await client.get("/books/search/?author=Genny")
+    assert [book["id"] for book in first.json()] == [book_id]
+
+    hits = search_cache.stats.hits
+    again = await client.get("/books/search/", params={"author": "  GENNY "})
+    assert again.json() == first.json()
+    assert search_cache.stats.hits == hits + 1
+
+    await client.put(f"/books/{book_id}", json={"year": 2001})
+    updated = await client.get("/books/search/?author=Genny")
+    assert updated.json()[0]["year"] == 2001
+    assert updated.headers["etag"] != first.headers["etag"]
+
+    await client.delete(f"/books/{book_id}")
+    assert (await client.get("/books/search/?author=Genny")).json() == []
+
+    stats = (await client.get("/cache/stats")).json()
+    assert 0 < stats["search"]["hit_ratio"] <= 1
+    assert "search_cache_hit_ratio" in (await client.get("/metrics")).text
+
+
+@pytest.mark.anyio
+async def test_search_pagination_sort_and_total(client):
+    books = [{"title": f"Paged Tome {i}", "author": "Zebulon Paginer", "year": 2000 + i % 3} for i in range(7)]
+    books.append({"title": "Paged Tome undated", "author": "Zebulon Paginer", "year": None})
+    await client.post("/books/bulk", json=books)
+
+    first = await client.get("/books/search/?author=Paginer&sort=year&limit=3&total=true")
+    assert first.headers["X-Total-Count"] == "8"
+    seen = first.json()
+    cursor = first.headers["X-Next-Cursor"]
+    while cursor:
+        page = await client.get("/books/search/", params={"author": "Zebulon Paginer", "sort": "year", "limit": 3, "after": cursor})
+        assert "X-Total-Count" not in page.headers
+        seen += page.json()
+        cursor = page.headers.get("X-Next-Cursor")
+    assert len(seen) == 8
+    assert [book["year"] for book in seen] == [2000, 2000, 2000, 2001, 2001, 2002, 2002, None]
+
+    by_title = await client.get("/books/search/?author=Paginer&sort=title&skip=2&limit=2")
+    assert [book["title"] for book in by_title.json()] == ["Paged Tome 2", "Paged Tome 3"]
+
+    relevance = await client.get("/books/search/?title=paged&limit=5")
+    assert len(relevance.json()) == 5
+    assert "X-Next-Cursor" not in relevance.headers
+    assert (await client.get(f"/books/search/?author=Paginer&sort=relevance&after={cursor or 'x'}")).status_code == 400
+
+
+@pytest.mark.anyio
+async def test_batch_read_books(client):
+    ids = []
+    for i in range(3):
+        response = await client.post("/books/", json={"title": f"Batched {i}", "author": "Batcher", "year": 1970 + i})
+        ids.append(response.json()["id"])
+    await client.get(f"/books/{ids[1]}")  # cached before the batch
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine_test.sync_engine, "before_cursor_execute", record)
+    try:
+        response = await client.get(f"/books/batch?ids={ids[2]},999999,{ids[0]},{ids[1]},{ids[2]}")
+    finally:
+        event.remove(engine_test.sync_engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    data = response.json()
+    assert [book["id"] for book in data["books"]] == [ids[2], ids[0], ids[1]]
+    assert data["books"][0] == {"title": "Batched 2", "author": "Batcher", "year": 1972, "id": ids[2]}
+    assert data["missing"] == [999999]
+    assert len(statements) == 1 and " IN " in statements[0]
+
+    posted = await client.post("/books/batch", json={"ids": [ids[1], ids[0]]})
+    assert [book["title"] for book in posted.json()["books"]] == ["Batched 1", "Batched 0"]
+    assert (await client.get("/books/batch?ids=1,x")).status_code == 422
+    assert (await client.post("/books/batch", json={"ids": []})).status_code == 422
+
+
+@pytest.mark.anyio
+async def test_single_flight_shares_concurrent_loads():
+    flights = SingleFlight("test")
+    calls = []
+    release = anyio.Event()
+
+    async def load():
+        calls.append(1)
+        await release.wait()
+        return "loaded"
+
+    results = []
+
+    async def caller():
+        results.append(await flights.do("key", load))
+
+    async with anyio.create_task_group() as tg:
+        for _ in range(5):
+            tg.start_soon(caller)
+        await anyio.wait_all_tasks_blocked()
+        release.set()
+    assert results == ["loaded"] * 5
+    assert calls == [1]
+
+    # Nothing is remembered once the flight has landed
+    release = anyio.Event()
+    release.set()
+    assert await flights.do("key", load) == "loaded"
+    assert len(calls) == 2
+
+
+@pytest.mark.anyio
+async def test_concurrent_book_reads_run_one_query(client):
+    book_id = (await client.post("/books/", json={"title": "Herd", "author": "Thunder", "year": 1988})).json()["id"]
+    await book_cache.clear()
+    selects = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append(statement)
+
+    event.listen(engine_test.sync_engine, "before_cursor_execute", record)
+    try:
+        responses = []
+
+        async def fetch():
+            responses.append(await client.get(f"/books/{book_id}"))
+
+        async with anyio.create_task_group() as tg:
+            for _ in range(10):
+                tg.start_soon(fetch)
+    finally:
+        event.remove(engine_test.sync_engine, "before_cursor_execute", record)
+    assert [r.status_code for r in responses] == [200] * 10
+    assert len(selects) == 1
+
+
+@pytest.mark.anyio
+async def test_reads_routed_to_replica_until_client_writes(client, tmp_path, monkeypatch):
+    router = ReplicaRouter([f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}"])
+    try:
+        # Stand-in replica that has not caught up: it only holds its own row
+        await migrations.migrate(router.engines[0])
+        async with router.engines[0].begin() as conn:
+            await conn.execute(text("INSERT INTO books (title, author, year) VALUES ('Replica Only', 'Mirror', 1)"))
+        monkeypatch.setattr("main.replicas", router)
+
+        assert [b["title"] for b in (await client.get("/books/search/?author=Mirror")).json()] == ["Replica Only"]
+
+        created = await client.post("/books/", json={"title": "Primary Only", "author": "Mirror", "year": 2})
+        assert created.status_code == 201
+        assert READ_YOUR_WRITES_COOKIE in created.cookies
+
+        # The client carries the cookie now, so it reads its own write from the primary
+        titles = [b["title"] for b in (await client.get("/books/search/?author=Mirror")).json()]
+        assert titles == ["Primary Only"]
+
+        client.cookies.clear()
+        assert [b["title"] for b in (await client.get("/books/?limit=1000")).json()] == ["Replica Only"]
+    finally:
+        client.cookies.clear()
+        await router.dispose()
+
+
+@pytest.mark.anyio
+async def test_read_racing_a_write_does_not_cache_old_row(client, monkeypatch):
+    import crud
+
+    book_id = (await client.post("/books/", json={"title": "OLD", "author": "Racer", "year": 1950})).json()["id"]
+    await book_cache.clear()
+    real_get_book, real_get_books_by_ids = crud.get_book, crud.get_books_by_ids
+
+    async def get_book_then_write(db, wanted_id):
+        book = await real_get_book(db, wanted_id)
+        # The PUT commits and invalidates the cache after the SELECT, before the fill
+        assert (await client.put(f"/books/{wanted_id}", json={"title": "NEW"})).status_code == 200
+        return book
+
+    monkeypatch.setattr(crud, "get_book", get_book_then_write)
+    assert (await client.get(f"/books/{book_id}")).json()["title"] == "OLD"
+    monkeypatch.setattr(crud, "get_book", real_get_book)
+    assert (await client.get(f"/books/{book_id}")).json()["title"] == "NEW"
+
+    await book_cache.clear()
+
+    async def get_books_then_write(db, ids):
+        rows = await real_get_books_by_ids(db, ids)
+        assert (await client.put(f"/books/{book_id}", json={"title": "NEWER"})).status_code == 200
+        return rows
+
+    monkeypatch.setattr(crud, "get_books_by_ids", get_books_then_write)
+    assert (await client.get(f"/books/batch?ids={book_id}")).json()["books"][0]["title"] == "NEW"
+    monkeypatch.setattr(crud, "get_books_by_ids", real_get_books_by_ids)
+    assert (await client.get(f"/books/{book_id}")).json()["title"] == "NEWER"
+
+
+@pytest.mark.anyio
+async def test_replica_reads_never_fill_caches(client, tmp_path, monkeypatch):
+    router = ReplicaRouter([f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}"])
+    try:
+        book_id = (await client.post("/books/", json={"title": "Lagging v1", "author": "Echo", "year": 3})).json()["id"]
+        # Stand-in replica that has the book but not the update below
+        await migrations.migrate(router.engines[0])
+        async with router.engines[0].begin() as conn:
+            await conn.execute(
+                text("INSERT INTO books (id, title, author, year) VALUES (:id, 'Lagging v1', 'Echo', 3)"), {"id": book_id}
+            )
+        monkeypatch.setattr("main.replicas", router)
+        client.cookies.clear()
+
+        updated = await client.put(f"/books/{book_id}", json={"title": "Lagging v2"})
+        assert READ_YOUR_WRITES_COOKIE in updated.cookies
+        cookies = dict(client.cookies)
+
+        # Another client fills the caches from the lagging replica
+        client.cookies.clear()
+        assert (await client.get(f"/books/{book_id}")).json()["title"] == "Lagging v1"
+        assert (await client.get(f"/books/batch?ids={book_id}")).json()["books"][0]["title"] == "Lagging v1"
+        assert [b["title"] for b in (await client.get("/books/search/?author=Echo")).json()] == ["Lagging v1"]
+
+        # The writer still sees its own write, and its browser must not keep older pages
+        client.cookies.update(cookies)
+        assert (await client.get(f"/books/{book_id}")).json()["title"] == "Lagging v2"
+        assert (await client.get(f"/books/batch?ids={book_id}")).json()["books"][0]["title"] == "Lagging v2"
+        search = await client.get("/books/search/?author=Echo")
+        assert [b["title"] for b in search.json()] == ["Lagging v2"]
+        assert search.headers["Cache-Control"] == "private, no-cache"
+        assert (await client.get("/books/?limit=5")).headers["Cache-Control"] == "private, no-cache"
+
+        # Once the replica catches up, everyone sees v2: nothing stale was cached
+        async with router.engines[0].begin() as conn:
+            await conn.execute(text("UPDATE books SET title = 'Lagging v2' WHERE id = :id"), {"id": book_id})
+        client.cookies.clear()
+        assert (await client.get(f"/books/{book_id}")).json()["title"] == "Lagging v2"
+        assert (await client.get(f"/books/batch?ids={book_id}")).json()["books"][0]["title"] == "Lagging v2"
+        search = await client.get("/books/search/?author=Echo")
+        assert [b["title"] for b in search.json()] == ["Lagging v2"]
+        assert search.headers["Cache-Control"].startswith("public")
+    finally:
+        client.cookies.clear()
+        await router.dispose()
+
+
+@pytest.mark.anyio
+async def test_seed_is_idempotent_and_skips_invalid_rows(tmp_path, monkeypatch, capsys):
+    import seed
+
+    file_engine = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'seed.db'}")
+    monkeypatch.setattr(seed, "engine", file_engine)
+    sessions = async_sessionmaker(bind=file_engine, expire_on_commit=False, class_=AsyncSession)
+    monkeypatch.setattr(seed, "AsyncSessionLocal", sessions)
+    csv_path = tmp_path / "books.csv"
+    csv_path.write_text("title,author,year\nSeeded CSV,Loader,2001\nNo Year,Loader,\nBad Year,Loader,soon\n", encoding="utf-8")
+    ndjson_path = tmp_path / "books.ndjson"
+    ndjson_path.write_text(
+        '{"title": "Seeded NDJSON", "author": "Loader", "year": 2003}\n'
+        "{not json\n"
+        "\n"
+        '{"title": "Seeded CSV", "author": "Loader", "year": 2001}\n',
+        encoding="utf-8",
+    )
+    files = [str(csv_path), str(ndjson_path)]
+    try:
+        first = await seed.seed(files=files, builtin=True, batch_size=2)
+        expected = (len(seed.books_data) + 6, len(seed.books_data) + 3, 2, 1)
+        assert (first.read, first.created, first.invalid, first.skipped) == expected
+        assert "not valid JSON" in capsys.readouterr().out
+
+        again = await seed.seed(files=files, builtin=True, synthetic=5)
+        assert (again.read, again.created, again.invalid) == (len(seed.books_data) + 11, 5, 2)
+
+        async with file_engine.connect() as conn:
+            count = (await conn.execute(text("SELECT COUNT(*) FROM books"))).scalar()
+            loaded = await conn.execute(text("SELECT title FROM books WHERE author = 'Loader' ORDER BY title"))
+            titles = loaded.scalars().all()
+        assert count == len(seed.books_data) + 8
+        assert titles == ["No Year", "Seeded CSV", "Seeded NDJSON"]
+    finally:
+        await file_engine.dispose()